@@ -1,3 +1,3 @@
 from .query_generation import QueryGenerationChain
 from .answer_generation import AnswerGenerationChain
-from .query_filter import FilterExtractionChain
+from .query_filter import FilterExtractionChain, SQLFilterExtractor
@@ -1,14 +1,13 @@
-from typing import List, Dict
+from typing import Iterator, List, Dict
 from operator import itemgetter
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 from langchain_core.output_parsers import StrOutputParser
 from langchain.memory.chat_memory import BaseChatMemory
-from langchain_openai import ChatOpenAI
+from app.backend.registry import get_llm
 from langchain_community.utilities.sql_database import SQLDatabase
 from langfuse.callback import CallbackHandler
 
-
 ANSWER_TEMPLATE_FEW_ETFS = """Your task is to repsond to the user question based solely on the previous messagges in the conversation and the list of ETFs found in the database. If no ETFs were found, you should simply respond saying so.
 
 Question:
@@ -85,7 +84,7 @@ class AnswerGenerationChain:
                 if n_results > self.max_rows_to_pass
                 else ANSWER_TEMPLATE_FEW_ETFS
             )
-            | ChatOpenAI()
+            | get_llm()
             | StrOutputParser()
         )
 
@@ -110,6 +109,23 @@ class AnswerGenerationChain:
 
         return answer
 
+    def stream(
+        self,
+        question: str,
+        results: List,
+        suggestions: List[str],
+        callbacks: List = [],
+    ) -> Iterator[str]:
+        return self.chain.stream(
+            {
+                "question": question,
+                "results": results,
+                "n_results": len(results),
+                "suggestions": suggestions,
+            },
+            config={"callbacks": callbacks},
+        )
+
 
 if __name__ == "__main__":
     from app.backend.prompts.etf import TABLES_DESCRIPTION
@@ -1,8 +1,10 @@
+from typing import List
 from langchain.prompts import PromptTemplate
 from langchain.output_parsers.boolean import BooleanOutputParser
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.messages import HumanMessage
-from langchain_openai import ChatOpenAI
+from langchain_core.language_models import BaseChatModel
+from app.backend.registry import get_llm
 
 CAPTION_FILTER_PROMPT_TEMPLATE = """Given the following caption of an image, return YES if the caption is about a graph, a plot or a scale and NO if it isn't.
 In particular you should return NO if the image is a logo, a title or a header.
@@ -12,48 +14,57 @@ In particular you should return NO if the image is a logo, a title or a header.
 
 
 class CaptionFilterChain:
-    def __init__(self) -> None:
+    def __init__(self, llm: BaseChatModel | None = None) -> None:
 
         self.chain = (
             PromptTemplate.from_template(CAPTION_FILTER_PROMPT_TEMPLATE)
-            | ChatOpenAI(temperature=0, model="gpt-3.5-turbo")
+            | (llm or get_llm(temperature=0, model="gpt-3.5-turbo"))
             | BooleanOutputParser()
         )
 
     def run(self, caption: str) -> bool:
         return self.chain.invoke({"caption": caption})
 
+    async def arun(self, caption: str) -> bool:
+        return await self.chain.ainvoke({"caption": caption})
+
 
 class ImageCaptioningChain:
-    def __init__(self) -> None:
+    def __init__(self, llm: BaseChatModel | None = None) -> None:
         self.prompt = (
             "Describe the image in detail. Be specific about graphs, such as bar plots."
         )
 
         self.chain = (
-            ChatOpenAI(model="gpt-4-vision-preview", max_tokens=1024)
-            | StrOutputParser()
-        )
+            llm or get_llm(model="gpt-4-vision-preview", max_tokens=1024)
+        ) | StrOutputParser()
 
     def run(self, image_b64: str, langfuse_handler=None):
         config = {}
         if langfuse_handler is not None:
             config["callbacks"] = [langfuse_handler]
 
-        return self.chain.invoke(
-            [
-                HumanMessage(
-                    content=[
-                        {"type": "text", "text": self.prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": f"data:image/jpeg;base64,{image_b64}"},
-                        },
-                    ]
-                )
-            ],
-            config=config,
-        )
+        return self.chain.invoke(self._make_messages(image_b64), config=config)
+
+    async def arun(self, image_b64: str, langfuse_handler=None):
+        config = {}
+        if langfuse_handler is not None:
+            config["callbacks"] = [langfuse_handler]
+
+        return await self.chain.ainvoke(self._make_messages(image_b64), config=config)
+
+    def _make_messages(self, image_b64: str) -> List[HumanMessage]:
+        return [
+            HumanMessage(
+                content=[
+                    {"type": "text", "text": self.prompt},
+                    {
+                        "type": "image_url",
+                        "image_url": {"url": f"data:image/jpeg;base64,{image_b64}"},
+                    },
+                ]
+            )
+        ]
 
 
 if __name__ == "__main__":
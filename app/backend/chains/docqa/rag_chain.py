@@ -1,4 +1,4 @@
-from typing import List, Mapping, Tuple
+from typing import Dict, Iterator, List, Mapping, Tuple
 from langchain.memory import ConversationBufferMemory
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
@@ -10,14 +10,17 @@ from langchain_core.prompts import (
     HumanMessagePromptTemplate,
 )
 from langchain_core.runnables import (
+    RunnableConfig,
     RunnableParallel,
     RunnablePassthrough,
     RunnableLambda,
 )
+from langchain_core.messages import BaseMessage
 from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+from app.backend.registry import get_llm
 from langfuse.callback import CallbackHandler
 from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
 
 CONDENSE_QUESTION_PROMPT_TEMPLATE = """Given the following conversation and a follow up question, rephrase the follow up question to be a standalone question, in its original language.
 
@@ -33,10 +36,12 @@ class RAGChain:
         retriever: BaseRetriever,
         combine_docs_func: Mapping[List[Document], str],
         langfuse_handler: CallbackHandler | None = None,
+        speculative_retrieval: bool = False,
     ) -> None:
         self.retriever = retriever
         self.combine_docs_func = combine_docs_func
         self.langfuse_handler = langfuse_handler
+        self.speculative_retrieval = speculative_retrieval
 
         self.memory = ConversationBufferMemory(
             return_messages=True, output_key="answer", input_key="question"
@@ -56,22 +61,15 @@ class RAGChain:
         # ------ RETRIEVE DOCS AND ADD THEM TO THE CHAIN--------- #
 
         # question, history -> standalone_question
-        condense_question = {
-            "standalone_question": PromptTemplate.from_template(
-                CONDENSE_QUESTION_PROMPT_TEMPLATE
-            )
-            | ChatOpenAI(temperature=0)
-            | StrOutputParser(),
-        }
-
-        # standalone_question -> docs
-        retrieve_docs = (
-            itemgetter("standalone_question") | self.retriever
-        )  # when should i use lambda and when itemgetter ????
+        self.condense_question_chain = (
+            PromptTemplate.from_template(CONDENSE_QUESTION_PROMPT_TEMPLATE)
+            | get_llm(temperature=0)
+            | StrOutputParser()
+        )
 
         # question, history -> question, history, docs
         retrieve_and_load_docs = RunnablePassthrough.assign(
-            docs=condense_question | retrieve_docs
+            docs=RunnableLambda(self._retrieve_docs)
         )
 
         # ------- GENERATE FINAL ANSWER WITH SOURCES -------- #
@@ -94,7 +92,7 @@ class RAGChain:
         )
 
         # docs, question, history -> output
-        generate_answer = load_context | generation_prompt | ChatOpenAI()
+        generate_answer = load_context | generation_prompt | get_llm()
 
         # docs, question, history -> answer, sources
         generate_answer_and_sources = RunnableParallel(
@@ -104,14 +102,63 @@ class RAGChain:
         return load_history | retrieve_and_load_docs | generate_answer_and_sources
 
     def run(self, question: str) -> Tuple[str, List[Document]]:
-        config = {}
-        if self.langfuse_handler:
-            config["callbacks"] = [self.langfuse_handler]
-
-        result = self.chain.invoke({"question": question}, config=config)
+        result = self.chain.invoke({"question": question}, config=self._get_config())
         answer = result["answer"].content
         source_docs = result["sources"]
 
         self.memory.save_context({"question": question}, {"answer": answer})
 
         return answer, source_docs
+
+    def stream(self, question: str) -> Iterator[Tuple[str, str | List[Document]]]:
+        """
+        Yields ("sources", docs) as soon as the documents are retrieved and then ("token", token)
+        for each token of the answer as it is generated.
+        """
+        answer = []
+        for chunk in self.chain.stream(
+            {"question": question}, config=self._get_config()
+        ):
+            if "sources" in chunk:
+                yield "sources", chunk["sources"]
+            if "answer" in chunk and chunk["answer"].content:
+                answer.append(chunk["answer"].content)
+                yield "token", chunk["answer"].content
+
+        self.memory.save_context({"question": question}, {"answer": "".join(answer)})
+
+    def _retrieve_docs(self, inputs: Dict, config: RunnableConfig) -> List[Document]:
+        question, history = inputs["question"], inputs["history"]
+
+        # The question of the first turn is already standalone
+        if len(history) == 0:
+            return self.retriever.invoke(question, config=config)
+
+        if not self.speculative_retrieval:
+            standalone_question = self._condense_question(question, history, config)
+            return self.retriever.invoke(standalone_question, config=config)
+
+        # Retrieve with the original question while it is being condensed, follow up questions
+        # are often already standalone
+        executor = ThreadPoolExecutor(max_workers=1)
+        speculative_docs = executor.submit(self.retriever.invoke, question, config)
+        try:
+            standalone_question = self._condense_question(question, history, config)
+            if standalone_question.strip() == question.strip():
+                return speculative_docs.result()
+            return self.retriever.invoke(standalone_question, config=config)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _condense_question(
+        self, question: str, history: List[BaseMessage], config: RunnableConfig
+    ) -> str:
+        return self.condense_question_chain.invoke(
+            {"question": question, "history": history}, config=config
+        )
+
+    def _get_config(self) -> Dict:
+        config = {}
+        if self.langfuse_handler:
+            config["callbacks"] = [self.langfuse_handler]
+        return config
@@ -1,9 +1,18 @@
+from typing import List
+import re
+from loguru import logger
 from langchain.prompts import ChatPromptTemplate
 from langchain.output_parsers.boolean import BooleanOutputParser
 from langchain_core.documents import Document
-from langchain_openai import ChatOpenAI
+from app.backend.registry import get_llm
 from langfuse.callback import CallbackHandler
 
+from app.backend.config import (
+    SOURCE_FILTER_MAX_CONCURRENCY,
+    SOURCE_FILTER_KEEP_OVERLAP,
+    SOURCE_FILTER_DROP_OVERLAP,
+)
+
 SOURCE_FILTER_PROMPT_TEMPLATE = """Given a question, the generated answer and a source document, return YES if information from the source document is useful for answering the question and NO if it isn't.
 
 > Question:
@@ -34,7 +43,7 @@ class SourceFilterChain:
 
         self.chain = (
             ChatPromptTemplate.from_template(SOURCE_FILTER_PROMPT_TEMPLATE)
-            | ChatOpenAI(temperature=0)
+            | get_llm(temperature=0)
             | BooleanOutputParser()
         )
 
@@ -59,3 +68,69 @@ class SourceFilterChain:
 
         # print(res)
         return res
+
+    def run_batch(
+        self,
+        question: str,
+        answer: str,
+        source_docs: List[Document],
+    ) -> List[bool]:
+        """
+        Judges all the sources at once. Sources sharing most or almost none of the answer terms are
+        kept or dropped directly, the others are judged by the LLM concurrently.
+        """
+        answer_terms = self._get_terms(answer)
+
+        verdicts = [None] * len(source_docs)
+        to_judge = []
+        for i, doc in enumerate(source_docs):
+            overlap = self.lexical_overlap(answer_terms, doc.page_content)
+            if overlap >= SOURCE_FILTER_KEEP_OVERLAP:
+                verdicts[i] = True
+            elif overlap <= SOURCE_FILTER_DROP_OVERLAP:
+                verdicts[i] = False
+            else:
+                to_judge.append(i)
+
+        logger.debug(
+            f"{len(source_docs) - len(to_judge)} out of {len(source_docs)} sources judged locally."
+        )
+
+        if len(to_judge) > 0:
+            config = {"max_concurrency": SOURCE_FILTER_MAX_CONCURRENCY}
+            if self.langfuse_handler:
+                config["callbacks"] = [self.langfuse_handler]
+
+            results = self.chain.batch(
+                [
+                    {
+                        "question": question,
+                        "answer": answer,
+                        "source": source_docs[i].page_content,
+                    }
+                    for i in to_judge
+                ],
+                config=config,
+                return_exceptions=True,
+            )
+            for i, res in zip(to_judge, results):
+                # Keep the source if the LLM output could not be parsed
+                verdicts[i] = res if isinstance(res, bool) else True
+
+        return verdicts
+
+    @staticmethod
+    def lexical_overlap(answer_terms: set, source: str) -> float:
+        """Fraction of the answer terms found in the source."""
+        if len(answer_terms) == 0:
+            return 0.0
+        return len(answer_terms & SourceFilterChain._get_terms(source)) / len(
+            answer_terms
+        )
+
+    @staticmethod
+    def _get_terms(text: str) -> set:
+        # Numbers are kept as they are usually the most informative terms of the answer
+        return {
+            t for t in re.findall(r"\w+", text.casefold()) if len(t) > 3 or t.isdigit()
+        }
@@ -1,6 +1,6 @@
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+from app.backend.registry import get_llm
 
 
 def create_summarize_chain():
@@ -10,7 +10,7 @@ def create_summarize_chain():
     prompt = ChatPromptTemplate.from_template(prompt_text)
 
     # Summary chain
-    model = ChatOpenAI(temperature=0, model="gpt-3.5-turbo")
+    model = get_llm(temperature=0, model="gpt-3.5-turbo")
     return {"element": lambda x: x} | prompt | model | StrOutputParser()
 
 
@@ -1,10 +1,13 @@
 from typing import Dict, List, Tuple
+import sqlglot
+from sqlglot import exp
+from loguru import logger
 from app.backend.config import DB_DIALECT
 
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.pydantic_v1 import BaseModel, Field
-from langchain_openai import ChatOpenAI
+from app.backend.registry import get_llm
 
 TEMPLATE = """
 Given the {dialect} query reported below, your task is to extract all values being used as filtering condition by a LIKE, IN or = operator within a WHERE clasues.
@@ -33,10 +36,119 @@ class FilterExtractionChain:
     def __init__(self) -> None:
         self.chain = PromptTemplate.from_template(
             TEMPLATE
-        ) | ChatOpenAI().with_structured_output(QueryFilters, method="json_mode")
+        ) | get_llm().with_structured_output(QueryFilters, method="json_mode")
 
     def run(self, query, callbacks: List = []) -> QueryFilters:
         return self.chain.invoke(
             {"query": query, "dialect": DB_DIALECT},
             config={"callbacks": callbacks},
         )
+
+
+class SQLFilterExtractor:
+    """
+    Extracts the values used as filtering conditions by the =, IN and LIKE operators of a WHERE clause
+    by walking the SQL AST, and rewrites the corrected values directly in the AST. The LLM based chain
+    is used only as a fallback for queries that cannot be parsed.
+    """
+
+    def __init__(self, dialect: str = DB_DIALECT) -> None:
+        self.dialect = dialect
+        self.fallback_chain = None
+
+    def run(self, query: str, callbacks: List = []) -> QueryFilters:
+        try:
+            tree = sqlglot.parse_one(query, read=self.dialect)
+        except sqlglot.errors.ParseError as e:
+            logger.warning(f"Unable to parse the query, using the LLM instead: {e}")
+            return self._get_fallback_chain().run(query=query, callbacks=callbacks)
+
+        filters = [
+            QueryFilter(column=column.name, value=self._strip_wildcards(literal))
+            for column, literal in self._find_filters(tree)
+        ]
+        return QueryFilters(filters=filters)
+
+    def apply_corrections(
+        self, query: str, corrections: Dict[Tuple[str, str], str]
+    ) -> str:
+        """Replaces the (column, value) filters values with their corrections."""
+        if len(corrections) == 0:
+            return query
+
+        try:
+            tree = sqlglot.parse_one(query, read=self.dialect)
+        except sqlglot.errors.ParseError:
+            for (_, value), correction in corrections.items():
+                query = query.replace(
+                    "'" + value.replace("'", "") + "'",
+                    "'" + correction.replace("'", "") + "'",
+                )
+            return query
+
+        for column, literal in self._find_filters(tree):
+            value = self._strip_wildcards(literal)
+            correction = corrections.get((column.name, value))
+            if correction is None:
+                continue
+
+            # Keep the LIKE wildcards around the corrected value
+            corrected = literal.this.replace(value, correction, 1)
+            literal.replace(exp.Literal.string(corrected))
+
+        return tree.sql(dialect=self.dialect)
+
+    @staticmethod
+    def _find_filters(tree: exp.Expression) -> List[Tuple[exp.Column, exp.Literal]]:
+        filters = []
+        for predicate in tree.find_all(exp.EQ, exp.Like, exp.In, bfs=False):
+            if predicate.find_ancestor(exp.Where) is None:
+                continue
+
+            if isinstance(predicate, exp.In):
+                column = predicate.this
+                literals = predicate.expressions
+            else:
+                column, literal = predicate.this, predicate.expression
+                if isinstance(column, exp.Literal):
+                    column, literal = literal, column
+                literals = [literal]
+
+            if not isinstance(column, exp.Column):
+                continue
+
+            for literal in literals:
+                if isinstance(literal, exp.Literal) and literal.is_string:
+                    filters.append((column, literal))
+
+        return filters
+
+    @staticmethod
+    def _strip_wildcards(literal: exp.Literal) -> str:
+        if isinstance(literal.parent, exp.Like):
+            return literal.this.strip("%")
+        return literal.this
+
+    def _get_fallback_chain(self) -> FilterExtractionChain:
+        if self.fallback_chain is None:
+            self.fallback_chain = FilterExtractionChain()
+        return self.fallback_chain
+
+
+if __name__ == "__main__":
+    extractor = SQLFilterExtractor()
+
+    query = "SELECT isin, name FROM etf_search_data WHERE domicile_country = 'ireland' AND currency IN ('EUR', 'usd') AND name LIKE '%msci world%';"
+    filters = extractor.run(query=query)
+    print(filters)
+
+    print(
+        extractor.apply_corrections(
+            query=query,
+            corrections={
+                ("domicile_country", "ireland"): "Ireland",
+                ("currency", "usd"): "USD",
+                ("name", "msci world"): "MSCI World",
+            },
+        )
+    )
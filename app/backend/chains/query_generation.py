@@ -10,7 +10,7 @@ from langchain_core.prompts import (
 from langchain_core.runnables import RunnablePassthrough, RunnableLambda
 from langchain_core.output_parsers.openai_tools import PydanticToolsParser
 from langchain.memory.chat_memory import BaseChatMemory
-from langchain_openai import ChatOpenAI
+from app.backend.registry import get_llm
 from langchain_core.pydantic_v1 import BaseModel, Field
 
 from app.backend.config import DB_DIALECT
@@ -71,7 +71,7 @@ class QueryGenerationChain:
         self.chain = (
             RunnablePassthrough.assign(**chain_additional_inputs)
             | ChatPromptTemplate.from_messages(messages=prompt_messages)
-            | ChatOpenAI().bind_tools(self.tools, tool_choice="any")
+            | get_llm().bind_tools(self.tools, tool_choice="any")
             | PydanticToolsParser(tools=self.tools)
         )
 
@@ -0,0 +1,176 @@
+from typing import Dict, List, Tuple
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from loguru import logger
+
+from langchain_core.embeddings import Embeddings
+
+from app.backend.retrievers.embeddings import get_embeddings
+from app.backend.config import (
+    DOCQA_ANSWER_CACHE_PATH,
+    DOCQA_ANSWER_CACHE_MAX_ENTRIES,
+    DOCQA_ANSWER_CACHE_TTL,
+    DOCQA_ANSWER_CACHE_SIMILARITY_THRESHOLD,
+)
+
+CREATE_ANSWERS_TABLE = """
+CREATE TABLE IF NOT EXISTS answers (
+    source_id VARCHAR(64),
+    question_hash VARCHAR(64),
+    question TEXT,
+    embedding BLOB,
+    answer TEXT,
+    sources_pages TEXT,
+    created_at REAL,
+    last_access REAL,
+    PRIMARY KEY (source_id, question_hash)
+);
+"""
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question.casefold()).strip().rstrip("?!. ")
+
+
+class DocQAAnswerCache:
+    """
+    Persistent cache of the answers to the first question of a conversation on a document, scoped by
+    the document source id. Questions are matched exactly after normalization first and then by the
+    similarity of their embeddings. Entries expire after the TTL, least recently used ones are evicted
+    beyond the maximum number of entries and all the entries of a document are invalidated when it is
+    re-ingested or deleted.
+    """
+
+    def __init__(
+        self,
+        db_path: str = DOCQA_ANSWER_CACHE_PATH,
+        max_entries: int = DOCQA_ANSWER_CACHE_MAX_ENTRIES,
+        ttl: float = DOCQA_ANSWER_CACHE_TTL,
+        similarity_threshold: float = DOCQA_ANSWER_CACHE_SIMILARITY_THRESHOLD,
+        embeddings: Embeddings | None = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.embeddings = embeddings if embeddings is not None else get_embeddings()
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute(CREATE_ANSWERS_TABLE)
+        self.lock = threading.Lock()
+
+    def lookup(
+        self, source_id: str, question: str
+    ) -> Tuple[str, Dict[str, List[str]]] | None:
+        """Returns the cached answer and sources pages of the question, if any."""
+        question = normalize_question(question)
+        min_created_at = time.time() - self.ttl
+
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT question_hash, answer, sources_pages FROM answers WHERE source_id = ? AND question_hash = ? AND created_at > ?;",
+                (source_id, self._hash(question), min_created_at),
+            ).fetchone()
+
+        if row is None and self.similarity_threshold < 1.0:
+            row = self._find_similar(source_id, question, min_created_at)
+
+        if row is None:
+            return None
+
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE answers SET last_access = ? WHERE source_id = ? AND question_hash = ?;",
+                (time.time(), source_id, row[0]),
+            )
+
+        logger.info(f"Found cached answer for question '{question}'.")
+        return row[1], json.loads(row[2])
+
+    def store(
+        self,
+        source_id: str,
+        question: str,
+        answer: str,
+        sources_pages: Dict[str, List[str]],
+    ):
+        question = normalize_question(question)
+        # With a threshold of 1.0 only exact matches can hit, the embedding would never be used
+        if self.similarity_threshold < 1.0:
+            embedding = np.asarray(
+                self.embeddings.embed_query(question), dtype=np.float32
+            ).tobytes()
+        else:
+            embedding = None
+
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO answers(source_id, question_hash, question, embedding, answer, sources_pages, created_at, last_access) VALUES (?,?,?,?,?,?,?,?);",
+                (
+                    source_id,
+                    self._hash(question),
+                    question,
+                    embedding,
+                    answer,
+                    json.dumps(sources_pages),
+                    time.time(),
+                    time.time(),
+                ),
+            )
+            self._evict()
+
+    def invalidate(self, source_id: str):
+        with self.lock, self.conn:
+            n_deleted = self.conn.execute(
+                "DELETE FROM answers WHERE source_id = ?;", (source_id,)
+            ).rowcount
+
+        logger.info(f"Invalidated {n_deleted} cached answers of source {source_id}.")
+
+    def _find_similar(
+        self, source_id: str, question: str, min_created_at: float
+    ) -> Tuple | None:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT question_hash, answer, sources_pages, embedding FROM answers WHERE source_id = ? AND created_at > ? AND embedding IS NOT NULL;",
+                (source_id, min_created_at),
+            ).fetchall()
+
+        if len(rows) == 0:
+            return None
+
+        query = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        matrix = np.stack([np.frombuffer(row[3], dtype=np.float32) for row in rows])
+
+        similarities = (matrix @ query) / (
+            np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12
+        )
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+
+        return rows[best][:3]
+
+    def _hash(self, question: str) -> str:
+        return hashlib.sha256(question.encode("utf-8")).hexdigest()
+
+    def _evict(self):
+        self.conn.execute(
+            "DELETE FROM answers WHERE created_at <= ?;", (time.time() - self.ttl,)
+        )
+
+        n_entries = self.conn.execute("SELECT COUNT(*) FROM answers;").fetchone()[0]
+        if n_entries <= self.max_entries:
+            return
+
+        self.conn.execute(
+            "DELETE FROM answers WHERE rowid IN (SELECT rowid FROM answers ORDER BY last_access ASC LIMIT ?);",
+            (n_entries - self.max_entries,),
+        )
+        logger.info(f"Evicted {n_entries - self.max_entries} cached answers.")
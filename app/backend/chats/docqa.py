@@ -1,9 +1,12 @@
-from typing import List, Tuple, Dict
+from typing import Iterator, List, Tuple, Dict
 from langfuse.callback import CallbackHandler
 from loguru import logger
+from langchain_core.documents import Document
 
 from app.backend.chains.docqa import RAGChain, SourceFilterChain
+from app.backend.chats.answer_cache import DocQAAnswerCache
 from app.backend.retrievers import MultiModalChromaRetriever, ChromaRetriever
+from app.backend.config import DOCQA_SPECULATIVE_RETRIEVAL
 
 
 class DocumentsQAChat:
@@ -14,15 +17,23 @@ class DocumentsQAChat:
         combine_docs_func,
         filter_irrelevant_sources: bool = False,
         langfuse_handler: CallbackHandler | None = None,
+        source_id: str | None = None,
+        answer_cache: DocQAAnswerCache | None = None,
+        speculative_retrieval: bool = DOCQA_SPECULATIVE_RETRIEVAL,
     ) -> None:
 
         self.filter_sources = filter_irrelevant_sources
 
+        # Answers are cached only for the first question of the conversation on a single document
+        self.source_id = source_id
+        self.answer_cache = answer_cache if source_id is not None else None
+
         self.retriever = retriever
         self.rag_chain = RAGChain(
             retriever=self.retriever,
             combine_docs_func=combine_docs_func,
             langfuse_handler=langfuse_handler,
+            speculative_retrieval=speculative_retrieval,
         )
 
         if self.filter_sources:
@@ -31,15 +42,74 @@ class DocumentsQAChat:
             )
 
     def chat(self, question: str) -> Tuple[str, Dict[str, List[str]]]:
+        use_cache = self._is_cacheable()
+        if use_cache:
+            cached = self._lookup_cached_answer(question)
+            if cached is not None:
+                return cached
+
         answer, sources = self.rag_chain.run(question=question)
+        sources_pages = self._get_sources_pages(question, answer, sources)
 
-        if self.filter_sources:
-            useful_sources = []
-            for source in sources:
-                if self.source_filter_chain.run(
-                    question=question, answer=answer, source_doc=source
-                ):
-                    useful_sources.append(source)
+        if use_cache:
+            self.answer_cache.store(self.source_id, question, answer, sources_pages)
+
+        return answer, sources_pages
+
+    def stream(self, question: str) -> Iterator[Tuple[str, str | Dict[str, List[str]]]]:
+        """
+        Yields ("token", token) for each token of the answer as it is generated, followed by
+        ("sources", sources_pages) once the sources have been filtered.
+        """
+        use_cache = self._is_cacheable()
+        if use_cache:
+            cached = self._lookup_cached_answer(question)
+            if cached is not None:
+                yield "token", cached[0]
+                yield "sources", cached[1]
+                return
+
+        answer, sources = [], []
+        for kind, value in self.rag_chain.stream(question=question):
+            if kind == "sources":
+                sources = value
+            else:
+                answer.append(value)
+                yield kind, value
+
+        answer = "".join(answer)
+        sources_pages = self._get_sources_pages(question, answer, sources)
+
+        if use_cache:
+            self.answer_cache.store(self.source_id, question, answer, sources_pages)
+
+        yield "sources", sources_pages
+
+    def _is_cacheable(self) -> bool:
+        return (
+            self.answer_cache is not None
+            and len(self.rag_chain.memory.chat_memory.messages) == 0
+        )
+
+    def _lookup_cached_answer(
+        self, question: str
+    ) -> Tuple[str, Dict[str, List[str]]] | None:
+        cached = self.answer_cache.lookup(source_id=self.source_id, question=question)
+        if cached is not None:
+            # Follow up questions are answered based on the cached answer
+            self.rag_chain.memory.save_context(
+                {"question": question}, {"answer": cached[0]}
+            )
+        return cached
+
+    def _get_sources_pages(
+        self, question: str, answer: str, sources: List[Document]
+    ) -> Dict[str, List[str]]:
+        if self.filter_sources and len(sources) > 0:
+            verdicts = self.source_filter_chain.run_batch(
+                question=question, answer=answer, source_docs=sources
+            )
+            useful_sources = [s for s, keep in zip(sources, verdicts) if keep]
 
             if len(useful_sources) == 0:
                 useful_sources.append(sources[0])
@@ -62,4 +132,4 @@ class DocumentsQAChat:
                 )
             )
 
-        return answer, sources_pages
+        return sources_pages
@@ -1,4 +1,6 @@
-from typing import Tuple
+from typing import Dict, Iterator, List, Tuple
+import asyncio
+import time
 import pandas as pd
 import random
 from loguru import logger
@@ -11,11 +13,12 @@ from langfuse.callback import CallbackHandler
 from app.backend.chains import (
     QueryGenerationChain,
     AnswerGenerationChain,
-    FilterExtractionChain,
+    SQLFilterExtractor,
 )
 from app.backend.retrievers.correction_catalog import DBValuesCatalog
+from app.backend.registry import registry
 from app.backend.prompts.etf import TABLES_DESCRIPTION, UNIQUE_COLUMNS
-from app.backend.utils import query_db
+from app.backend.query_cache import cached_query_db, get_db_version
 from app.backend.config import (
     MAX_ROWS_TO_PASS,
     N_SUGGESTIONS,
@@ -25,6 +28,10 @@ from app.backend.config import (
     CATALOG_COLUMNS,
 )
 
+NO_RESPONSE_ANSWER = "I am sorry but I was not able to generate a valid response!"
+
+_db_descriptions = {}
+
 
 class ETFSearchChat:
     def __init__(self) -> None:
@@ -50,70 +57,148 @@ class ETFSearchChat:
             max_rows_to_pass=MAX_ROWS_TO_PASS,
         )
 
-        self.filter_chain = FilterExtractionChain()
-        self.correction_catalog = DBValuesCatalog()
+        self.filter_extractor = SQLFilterExtractor()
+        self.correction_catalog: DBValuesCatalog = registry.get("values_catalog")
 
     def chat(self, question: str) -> Tuple[str, pd.DataFrame | None]:
-        query, answer = self.query_chain.run(
-            question=question, callbacks=[self.langfuse_handler]
+        tokens, etfs_found_df = self.stream(question=question)
+        return "".join(tokens), etfs_found_df
+
+    def stream(self, question: str) -> Tuple[Iterator[str], pd.DataFrame | None]:
+        """
+        Runs all the stages needed to find the ETFs, then returns them together with the stream of
+        the answer tokens. The conversation memory is updated once the stream is consumed.
+        """
+        timings = {}
+        answer, etfs_found_df, results_to_pass, suggestions = asyncio.run(
+            self._aprepare(question=question, timings=timings)
         )
-        logger.info(f"Generated the following query: {query}")
-
-        if query is None and answer is None:
-            return "I am sorry but I was not able to generate a valid response!", None
 
-        if query is None:
-            etfs_found_df = None
+        if answer is not None:
+            tokens = iter([answer])
         else:
-            filters = self.filter_chain.run(
-                query=query, callbacks=[self.langfuse_handler]
+            tokens = self.answer_chain.stream(
+                question=question,
+                results=results_to_pass,
+                suggestions=suggestions,
+                callbacks=[self.langfuse_handler],
             )
 
-            for f in filters.filters:
-                if f.column in CATALOG_COLUMNS:
-                    correction = self.correction_catalog.get_correction(
-                        column=f.column, value=f.value
-                    )
+        # As in the original flow, the failure message is not saved in the conversation
+        return (
+            self._stream_answer(
+                question, tokens, timings, save_context=answer != NO_RESPONSE_ANSWER
+            ),
+            etfs_found_df,
+        )
+
+    async def _aprepare(
+        self, question: str, timings: Dict[str, float]
+    ) -> Tuple[str | None, pd.DataFrame | None, List | None, List[str] | None]:
+        start = time.perf_counter()
+        query, answer = await asyncio.to_thread(
+            self.query_chain.run, question=question, callbacks=[self.langfuse_handler]
+        )
+        timings["query_generation"] = time.perf_counter() - start
+        logger.info(f"Generated the following query: {query}")
 
-                    if correction is not None and correction != f.value:
-                        logger.info(f"{f.value} -> {correction}")
+        if query is None and answer is None:
+            return NO_RESPONSE_ANSWER, None, None, None
 
-                        query = query.replace(
-                            "'" + f.value.replace("'", "") + "'",
-                            "'" + correction.replace("'", "") + "'",
-                        )
+        if query is None:
+            return answer, None, None, None
 
+        start = time.perf_counter()
+        filters = self.filter_extractor.run(
+            query=query, callbacks=[self.langfuse_handler]
+        )
+        catalog_filters = [f for f in filters.filters if f.column in CATALOG_COLUMNS]
+        timings["filter_extraction"] = time.perf_counter() - start
+
+        # The query is executed speculatively while the filters values are being corrected,
+        # most of the times they are already correct
+        start = time.perf_counter()
+        speculative_query = asyncio.create_task(
+            asyncio.to_thread(cached_query_db, db_path=ETF_DB_PATH, query=query)
+        )
+        try:
+            corrections = await asyncio.to_thread(
+                self.correction_catalog.get_corrections,
+                [(f.column, f.value) for f in catalog_filters],
+            )
+        except BaseException:
+            self._discard(speculative_query)
+            raise
+        timings["corrections"] = time.perf_counter() - start
+
+        corrections = {
+            (f.column, f.value): correction
+            for f, correction in zip(catalog_filters, corrections)
+            if correction is not None and correction != f.value
+        }
+        for (_, value), correction in corrections.items():
+            logger.info(f"{value} -> {correction}")
+
+        start = time.perf_counter()
+        if len(corrections) == 0:
+            etfs_found_df = await speculative_query
+        else:
+            query = self.filter_extractor.apply_corrections(
+                query=query, corrections=corrections
+            )
             logger.info(f"Corrected query: {query}")
 
-            etfs_found_df = query_db(db_path=ETF_DB_PATH, query=query)
+            self._discard(speculative_query)
+            etfs_found_df = await asyncio.to_thread(
+                cached_query_db, db_path=ETF_DB_PATH, query=query
+            )
+        timings["query_execution"] = time.perf_counter() - start
 
-            results_to_pass = etfs_found_df.drop(
-                columns=[
-                    c
-                    for c in etfs_found_df.columns.to_list()
-                    if c not in COLUMNS_TO_PASS
-                ]
-            ).values.tolist()
+        results_to_pass = etfs_found_df.drop(
+            columns=[
+                c for c in etfs_found_df.columns.to_list() if c not in COLUMNS_TO_PASS
+            ]
+        ).values.tolist()
 
-            if len(etfs_found_df) > MAX_ROWS_TO_PASS:
-                suggestions = self.find_suggestions(
-                    etfs_df=etfs_found_df, n=N_SUGGESTIONS
-                )
-            else:
-                suggestions = None
+        if len(etfs_found_df) > MAX_ROWS_TO_PASS:
+            suggestions = self.find_suggestions(etfs_df=etfs_found_df, n=N_SUGGESTIONS)
+        else:
+            suggestions = None
 
-            answer = self.answer_chain.run(
-                question=question,
-                results=results_to_pass,
-                suggestions=suggestions,
-                callbacks=[self.langfuse_handler],
-            )
+        return None, etfs_found_df, results_to_pass, suggestions
 
-        self.memory.save_context(
-            inputs={"question": question}, outputs={"answer": answer}
+    @staticmethod
+    def _discard(task: asyncio.Task):
+        # The outcome of the discarded task is retrieved once done, so that a failure of the
+        # speculative query is not reported as a never retrieved exception
+        task.cancel()
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    def _stream_answer(
+        self,
+        question: str,
+        tokens: Iterator[str],
+        timings: Dict[str, float],
+        save_context: bool = True,
+    ) -> Iterator[str]:
+        start = time.perf_counter()
+        answer = []
+        for token in tokens:
+            if len(answer) == 0:
+                timings["first_token"] = time.perf_counter() - start
+            answer.append(token)
+            yield token
+        timings["answer_generation"] = time.perf_counter() - start
+
+        logger.info(
+            "Stages timings: "
+            + ", ".join([f"{stage} {t:.2f}s" for stage, t in timings.items()])
         )
 
-        return answer, etfs_found_df
+        if save_context:
+            self.memory.save_context(
+                inputs={"question": question}, outputs={"answer": "".join(answer)}
+            )
 
     def find_suggestions(self, etfs_df: pd.DataFrame, n: int = 3):
         # Found columns in df that have more than one unique values
@@ -125,6 +210,17 @@ class ETFSearchChat:
 
     @staticmethod
     def _build_db_description(db_path) -> str:
+        # The description only changes with the DB, avoid inspecting it for every new chat
+        # Only the description of the current version of each DB is kept
+        version = get_db_version(db_path)
+        cached = _db_descriptions.get(db_path)
+        if cached is None or cached[0] != version:
+            cached = (version, ETFSearchChat._inspect_db(db_path))
+            _db_descriptions[db_path] = cached
+        return cached[1]
+
+    @staticmethod
+    def _inspect_db(db_path) -> str:
         db = SQLDatabase.from_uri(
             "sqlite:///" + db_path,
             view_support=True,
@@ -18,3 +18,54 @@ CATALOG_COLUMNS = [
 CATALOG_DB_PATH = "data/retriever/test_catalog"
 CATALOG_DB_COLLECTION = "etf_properties"
 CORRECTION_THRESHOLD = 0.85
+
+DIGEST_CACHE_PATH = "data/cache/file_digests.sqlite3"
+DIGEST_CACHE_MAX_ENTRIES = 1000
+DIGEST_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Pages without raster images are still sent to the layout model if they contain at least these
+# many vector drawings (plots are often drawn as vector graphics), set to 0 to disable
+IMAGE_PAGE_MIN_DRAWINGS = 50
+
+CAPTIONING_MAX_CONCURRENCY = 8
+CAPTIONING_REQUESTS_PER_SECOND = 2.0
+CAPTIONING_MAX_RETRIES = 3
+
+CAPTION_STORE_PATH = "data/cache/captions.sqlite3"
+CAPTION_STORE_MAX_ENTRIES = 50000
+CAPTION_STORE_MAX_SIZE = 100 * 1024 * 1024  # bytes of captions text
+# Near-duplicate images (perceptual hashes within this hamming distance) reuse a cached discard verdict
+CAPTION_STORE_MAX_PHASH_DISTANCE = 4
+
+# Local pre-filter discarding obvious logos/banners before captioning
+PREFILTER_MIN_SIDE = 64  # pixels
+PREFILTER_MIN_AREA = 120 * 120  # pixels
+PREFILTER_MAX_ASPECT_RATIO = 6.0
+PREFILTER_MIN_ENTROPY = 1.5  # bits, grayscale histogram
+PREFILTER_MIN_EDGE_DENSITY = 0.02
+PREFILTER_MAX_REPEATS = 3  # images repeated on this many pages are considered branding
+
+EMBEDDING_BATCH_SIZE = 256
+EMBEDDING_MAX_CONCURRENCY = 4
+
+EMBEDDING_CACHE_PATH = "data/cache/embeddings.sqlite3"
+EMBEDDING_CACHE_MAX_SIZE = 500 * 1024 * 1024  # bytes
+
+SOURCE_FILTER_MAX_CONCURRENCY = 5
+# Sources are kept or dropped without calling the LLM if the fraction of the answer terms they contain
+# is above or below these thresholds
+SOURCE_FILTER_KEEP_OVERLAP = 0.6
+SOURCE_FILTER_DROP_OVERLAP = 0.05
+
+# Retrieve with the raw follow up question while it is condensed, reused if the rewrite is unchanged
+DOCQA_SPECULATIVE_RETRIEVAL = False
+
+DOCQA_ANSWER_CACHE_PATH = "data/cache/docqa_answers.sqlite3"
+DOCQA_ANSWER_CACHE_MAX_ENTRIES = 5000
+DOCQA_ANSWER_CACHE_TTL = 7 * 24 * 3600  # seconds
+DOCQA_ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95  # set to 1.0 to only use exact matches
+
+QUERY_CACHE_MAX_SIZE = 128 * 1024 * 1024  # bytes of cached DataFrames
+
+SQLITE_POOL_SIZE = 8  # read-only connections kept open per DB
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
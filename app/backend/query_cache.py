@@ -0,0 +1,76 @@
+from collections import OrderedDict
+import os
+import re
+import threading
+import pandas as pd
+import sqlglot
+from loguru import logger
+
+from app.backend.utils import query_db, get_db_version
+from app.backend.config import DB_DIALECT, QUERY_CACHE_MAX_SIZE
+
+
+def normalize_sql(query: str, dialect: str = DB_DIALECT) -> str:
+    """Canonical form of the query, so that differently formatted queries share the same results."""
+    try:
+        return sqlglot.parse_one(query, read=dialect).sql(
+            dialect=dialect, normalize=True
+        )
+    except sqlglot.errors.ParseError:
+        return re.sub(r"\s+", " ", query).strip().rstrip(";")
+
+
+class QueryResultCache:
+    """
+    Process-wide LRU cache of query results keyed by the normalized query and the version of the DB
+    file, so results are invalidated as soon as the DB changes. The cache is bounded by the memory used
+    by the cached DataFrames, copies are returned so that callers can freely modify them.
+    """
+
+    def __init__(self, max_size: int = QUERY_CACHE_MAX_SIZE) -> None:
+        self.max_size = max_size
+        self.size = 0
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def query(self, db_path: str, query: str) -> pd.DataFrame:
+        key = (os.path.abspath(db_path), normalize_sql(query))
+        version = get_db_version(db_path)
+
+        with self.lock:
+            cached = self.results.get(key)
+            if cached is not None and cached[0] == version:
+                self.results.move_to_end(key)
+                self.hits += 1
+                return cached[1].copy()
+            self.misses += 1
+
+        df = query_db(db_path=db_path, query=query)
+        size = int(df.memory_usage(deep=True).sum())
+
+        with self.lock:
+            if key in self.results:
+                self.size -= self.results.pop(key)[2]
+
+            if size <= self.max_size:
+                self.results[key] = (version, df.copy(), size)
+                self.size += size
+
+            while self.size > self.max_size:
+                _, (_, _, evicted_size) = self.results.popitem(last=False)
+                self.size -= evicted_size
+
+        logger.debug(
+            f"Query results cache: {len(self.results)} results, {self.size} bytes."
+        )
+        return df
+
+
+_query_cache = QueryResultCache()
+
+
+def cached_query_db(db_path: str, query: str) -> pd.DataFrame:
+    return _query_cache.query(db_path=db_path, query=query)
@@ -0,0 +1,55 @@
+from typing import Callable, Awaitable, TypeVar
+import time
+import random
+import asyncio
+from loguru import logger
+
+T = TypeVar("T")
+
+
+class AsyncTokenBucket:
+    """Token bucket limiting the rate at which coroutines can start new requests."""
+
+    def __init__(self, rate: float, capacity: int | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1, int(rate))
+
+        self._tokens = float(self.capacity)
+        self._last_refill = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._last_refill) * self.rate
+                )
+                self._last_refill = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def retry_with_backoff(
+    func: Callable[[], Awaitable[T]],
+    max_retries: int = 3,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+) -> T:
+    """Awaits func, retrying it with exponential backoff and jitter when it raises."""
+    for attempt in range(max_retries + 1):
+        try:
+            return await func()
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+
+            delay = min(max_delay, base_delay * 2**attempt) * (0.5 + random.random())
+            logger.warning(
+                f"Request failed ({e.__class__.__name__}), retrying in {delay:.1f}s ({attempt + 1}/{max_retries})"
+            )
+            await asyncio.sleep(delay)
@@ -0,0 +1,130 @@
+from typing import Any, Callable, Dict, Hashable, List
+import threading
+from loguru import logger
+
+
+class ResourceRegistry:
+    """
+    Process-wide registry of the heavy and stateless components (clients, models, chains...) shared
+    by all the sessions. Resources are created lazily and only once, even when requested concurrently,
+    per-session state must never be stored in them. Registered resources can be created in advance
+    with warmup and checked with their health hooks.
+    """
+
+    def __init__(self) -> None:
+        self.resources: Dict[Hashable, Any] = {}
+        self.factories: Dict[Hashable, Callable[[], Any]] = {}
+        self.health_checks: Dict[Hashable, Callable[[Any], bool]] = {}
+
+        self.lock = threading.Lock()
+        self.resource_locks: Dict[Hashable, threading.Lock] = {}
+
+    def register(
+        self,
+        key: Hashable,
+        factory: Callable[[], Any],
+        health_check: Callable[[Any], bool] | None = None,
+    ):
+        with self.lock:
+            self.factories[key] = factory
+            if health_check is not None:
+                self.health_checks[key] = health_check
+
+    def get(self, key: Hashable) -> Any:
+        if key not in self.factories:
+            raise KeyError(f"Resource {key} not registered!")
+        return self.get_or_create(key, self.factories[key])
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        resource = self.resources.get(key)
+        if resource is not None:
+            return resource
+
+        with self.lock:
+            resource_lock = self.resource_locks.setdefault(key, threading.Lock())
+
+        # Other resources can be created while this one is being created
+        with resource_lock:
+            if key not in self.resources:
+                logger.info(f"Creating shared resource {key}...")
+                self.resources[key] = factory()
+            return self.resources[key]
+
+    def warmup(self, keys: List[Hashable] | None = None):
+        for key in keys if keys is not None else list(self.factories):
+            self.get(key)
+
+    def health(self) -> Dict[Hashable, bool]:
+        """Runs the health hooks of the resources created so far."""
+        status = {}
+        for key, check in list(self.health_checks.items()):
+            if key not in self.resources:
+                continue
+            try:
+                status[key] = bool(check(self.resources[key]))
+            except Exception as e:
+                logger.opt(exception=e).warning(f"Health check of {key} failed.")
+                status[key] = False
+        return status
+
+    def reset(self, key: Hashable):
+        with self.lock:
+            self.resources.pop(key, None)
+
+
+registry = ResourceRegistry()
+
+
+def get_chroma_client(path: str):
+    import chromadb
+
+    return registry.get_or_create(
+        ("chroma_client", path), lambda: chromadb.PersistentClient(path=path)
+    )
+
+
+def get_llm(**kwargs):
+    """Shared chat model client for the given parameters."""
+    from langchain_openai import ChatOpenAI
+
+    key = ("llm",) + tuple(sorted(kwargs.items()))
+    return registry.get_or_create(key, lambda: ChatOpenAI(**kwargs))
+
+
+def _create_embeddings():
+    from langchain_openai import OpenAIEmbeddings
+    from app.backend.retrievers.embeddings import CachedEmbeddings
+
+    return CachedEmbeddings(OpenAIEmbeddings())
+
+
+def _create_summarize_chain():
+    from app.backend.chains.docqa.summarize_table import create_summarize_chain
+
+    return create_summarize_chain()
+
+
+def _create_answer_cache():
+    from app.backend.chats.answer_cache import DocQAAnswerCache
+
+    return DocQAAnswerCache()
+
+
+def _create_values_catalog():
+    from app.backend.retrievers.correction_catalog import DBValuesCatalog
+
+    return DBValuesCatalog()
+
+
+registry.register(
+    "embeddings",
+    _create_embeddings,
+    health_check=lambda embeddings: len(embeddings.embed_query("health check")) > 0,
+)
+registry.register("table_summarize_chain", _create_summarize_chain)
+registry.register("docqa_answer_cache", _create_answer_cache)
+registry.register(
+    "values_catalog",
+    _create_values_catalog,
+    health_check=lambda catalog: catalog.vectorstore._collection.count() > 0,
+)
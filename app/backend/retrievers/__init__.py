@@ -1,2 +1,13 @@
-from .chroma import ChromaRetriever
-from .multi_modal import MultiModalChromaRetriever
+# Retrievers depend on heavy packages (chromadb, langchain, openai...), they are imported at first use
+_LAZY_IMPORTS = {
+    "ChromaRetriever": ".chroma",
+    "MultiModalChromaRetriever": ".multi_modal",
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_IMPORTS:
+        import importlib
+
+        return getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
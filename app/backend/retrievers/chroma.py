@@ -1,13 +1,18 @@
 from abc import abstractmethod, ABCMeta
 from typing import List
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from loguru import logger
 
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
+from langchain_core.embeddings import Embeddings
 from langchain_community.vectorstores.chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
 
 from app.backend.splitters import PDFSplitter
+from app.backend.retrievers.embeddings import get_embeddings
+from app.backend.registry import get_chroma_client
+from app.backend.config import EMBEDDING_BATCH_SIZE, EMBEDDING_MAX_CONCURRENCY
 
 
 class ChromaRetriever:
@@ -15,12 +20,15 @@ class ChromaRetriever:
         self,
         chroma_store: str,
         collection: str | None = None,
-        embeddings=OpenAIEmbeddings(),
+        embeddings: Embeddings | None = None,
         top_k: int = 4,
         source_id: str | None = None,
         search_type: str = "mmr",
     ) -> None:
 
+        if embeddings is None:
+            embeddings = get_embeddings()
+
         self.embeddings = embeddings
         self.top_k = top_k
         self.source_id = source_id
@@ -33,7 +41,7 @@ class ChromaRetriever:
             self.search_config["filter"] = {"source_id": self.source_id}
 
         self.vectorstore = Chroma(
-            persist_directory=chroma_store,
+            client=get_chroma_client(chroma_store),
             collection_name=collection,
             collection_metadata={"hnsw:space": "cosine"},
             embedding_function=embeddings,
@@ -79,9 +87,45 @@ class ChromaRetriever:
     ):
         docs = splitter.split(file_path=file_path)
 
-        self.vectorstore.add_documents(documents=docs)
+        self.upsert_documents(docs)
         logger.info(f"Added {len(docs)} documents to the database.")
 
+    def upsert_documents(self, docs: List[Document]) -> List[str]:
+        """
+        Embeds the documents in concurrent batches and writes them to the collection with a single
+        bulk upsert (split only if it exceeds the maximum batch size supported by Chroma).
+        """
+        if len(docs) == 0:
+            return []
+
+        ids = [str(uuid.uuid4()) for _ in docs]
+        texts = [doc.page_content for doc in docs]
+        embeddings = self.embed_documents_batched(texts)
+
+        max_batch_size = self.vectorstore._client.max_batch_size
+        for start in range(0, len(docs), max_batch_size):
+            end = start + max_batch_size
+            self.vectorstore._collection.upsert(
+                ids=ids[start:end],
+                embeddings=embeddings[start:end],
+                metadatas=[doc.metadata for doc in docs[start:end]],
+                documents=texts[start:end],
+            )
+
+        return ids
+
+    def embed_documents_batched(self, texts: List[str]) -> List[List[float]]:
+        batches = [
+            texts[i : i + EMBEDDING_BATCH_SIZE]
+            for i in range(0, len(texts), EMBEDDING_BATCH_SIZE)
+        ]
+        if len(batches) == 1:
+            return self.embeddings.embed_documents(batches[0])
+
+        with ThreadPoolExecutor(max_workers=EMBEDDING_MAX_CONCURRENCY) as executor:
+            batches_embeddings = executor.map(self.embeddings.embed_documents, batches)
+            return [e for embeddings in batches_embeddings for e in embeddings]
+
     def get_retriever(self) -> BaseRetriever:
         return self.vectorstore.as_retriever(
             search_type=self.search_type,
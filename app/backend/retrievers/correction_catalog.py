@@ -1,11 +1,16 @@
 from typing import List, Tuple
+import os
+import json
+import hashlib
+import threading
 from loguru import logger
 
 from langchain_community.vectorstores.chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
 
-from app.backend.chains import FilterExtractionChain
-from app.backend.utils import query_db
+from app.backend.utils import query_db, get_db_version
+from app.backend.retrievers.embeddings import get_embeddings
+from app.backend.retrievers.lexical_index import LexicalIndex
+from app.backend.registry import get_chroma_client
 from app.backend.config import (
     SEARCH_TABLES,
     ETF_DB_PATH,
@@ -17,50 +22,168 @@ from app.backend.config import (
 
 
 class DBValuesCatalog:
-    def __init__(self) -> None:
-        self.filter_chain = FilterExtractionChain()
+    """
+    Vector catalog of the distinct values of the categorical columns of the ETF DB, used to correct the
+    values of the query filters. The catalog is refreshed incrementally: values are stored with stable
+    ids derived from the column and the value, so only the values added or removed from the DB are
+    embedded or deleted. A fingerprint of the DB file is stored next to the catalog, so that a start with
+    an unchanged DB does not query it at all. Corrections are first looked up in an in-memory lexical
+    index of the values, the embeddings are used only when no value is lexically close enough.
+    The catalog is shared by all the sessions, so it is refreshed again whenever the DB file changes.
+    """
 
+    def __init__(self) -> None:
         self.vectorstore = Chroma(
-            persist_directory=CATALOG_DB_PATH,
+            client=get_chroma_client(CATALOG_DB_PATH),
             collection_name=CATALOG_DB_COLLECTION,
             collection_metadata={"hnsw:space": "cosine"},
-            embedding_function=OpenAIEmbeddings(),
+            embedding_function=get_embeddings(),
         )
+        self.fingerprint_path = os.path.join(
+            CATALOG_DB_PATH, f"{CATALOG_DB_COLLECTION}.fingerprint.json"
+        )
+
+        self.lock = threading.Lock()
+        self.db_version = None
+        self.refresh()
 
-        df = query_db(query=f"SELECT * FROM {SEARCH_TABLES[0]}", db_path=ETF_DB_PATH)
+    def refresh_if_changed(self):
+        with self.lock:
+            if get_db_version(ETF_DB_PATH) != self.db_version:
+                self.refresh()
 
-        out_of_date = False
-        docs, metadata = [], []
-        for col in CATALOG_COLUMNS:
-            values = self.vectorstore.get(where={"column": col})["documents"]
+    def refresh(self, force: bool = False):
+        self.db_version = get_db_version(ETF_DB_PATH)
+        fingerprint = self._compute_fingerprint()
+        if not force and fingerprint == self._load_fingerprint():
+            logger.debug("Catalog up to date.")
+            data = self.vectorstore.get(include=["documents", "metadatas"])
+            self.lexical_index = LexicalIndex(
+                (md["column"], value)
+                for md, value in zip(data["metadatas"], data["documents"])
+            )
+            return
+
+        values = self._get_db_values()
+        ids = [self._value_id(col, value) for col, value in values]
 
-            _docs = df[col].unique()
-            docs.extend(_docs)
-            metadata.extend([{"column": col}] * len(_docs))
+        current_ids = set(self.vectorstore.get(include=[])["ids"])
+        new_ids = set(ids)
 
-            if set(values) != set(_docs):
-                print(set(values), set(_docs))
-                out_of_date = True
+        to_delete = list(current_ids - new_ids)
+        to_add = [
+            (id, col, value)
+            for id, (col, value) in zip(ids, values)
+            if id not in current_ids
+        ]
 
-        if out_of_date:
-            logger.info("Catalog out of date, updating...")
-            self.vectorstore.delete_collection()
-            self.vectorstore._collection = self.vectorstore._client.create_collection(
-                name=CATALOG_DB_COLLECTION,
-                metadata={"hnsw:space": "cosine"},
+        if len(to_delete) > 0:
+            self.vectorstore.delete(ids=to_delete)
+
+        if len(to_add) > 0:
+            self.vectorstore.add_texts(
+                texts=[value for _, _, value in to_add],
+                metadatas=[{"column": col} for _, col, _ in to_add],
+                ids=[id for id, _, _ in to_add],
             )
-            self.vectorstore.add_texts(texts=docs, metadatas=metadata)
 
-    def get_correction(self, column, value) -> str | None:
-        doc, score = self.vectorstore.similarity_search_with_relevance_scores(
-            query=value, k=1, filter={"column": column}
-        )[0]
+        logger.info(
+            f"Catalog refreshed: {len(to_add)} values added, {len(to_delete)} values deleted."
+        )
+        self._save_fingerprint(fingerprint)
+        self.lexical_index = LexicalIndex(values)
+
+    def _get_db_values(self) -> List[Tuple[str, str]]:
+        query = " UNION ALL ".join(
+            [
+                f"SELECT DISTINCT '{col}', CAST({col} AS TEXT) FROM {SEARCH_TABLES[0]} WHERE {col} IS NOT NULL"
+                for col in CATALOG_COLUMNS
+            ]
+        )
+        rows, _ = query_db(db_path=ETF_DB_PATH, query=query, return_df=False)
+
+        # Several raw values of a column can be cast to the same text
+        return list(dict.fromkeys((col, value) for col, value in rows))
 
-        if score > CORRECTION_THRESHOLD:
-            return doc.page_content
-        else:
+    @staticmethod
+    def _value_id(column: str, value: str) -> str:
+        return hashlib.sha256(f"{column}:{value}".encode("utf-8")).hexdigest()
+
+    def _compute_fingerprint(self) -> dict:
+        stat = os.stat(ETF_DB_PATH)
+        return {
+            "db_size": stat.st_size,
+            "db_mtime_ns": stat.st_mtime_ns,
+            "table": SEARCH_TABLES[0],
+            "columns": CATALOG_COLUMNS,
+            "embeddings": getattr(self.vectorstore.embeddings, "model", None),
+            "n_values": self.vectorstore._collection.count(),
+        }
+
+    def _load_fingerprint(self) -> dict | None:
+        if not os.path.exists(self.fingerprint_path):
             return None
 
+        with open(self.fingerprint_path, "r") as f:
+            return json.load(f)
+
+    def _save_fingerprint(self, fingerprint: dict):
+        # The number of values is the one after the refresh
+        fingerprint["n_values"] = self.vectorstore._collection.count()
+
+        tmp_path = f"{self.fingerprint_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(fingerprint, f)
+        os.replace(tmp_path, self.fingerprint_path)
+
+    def get_correction(self, column, value) -> str | None:
+        return self.get_corrections([(column, value)])[0]
+
+    def get_corrections(self, filters: List[Tuple[str, str]]) -> List[str | None]:
+        """
+        Returns the correction (or None) of each (column, value) filter. Most values match a catalog
+        value exactly or up to a typo, the remaining ones are embedded in a single batch and searched
+        with one query per column.
+        """
+        self.refresh_if_changed()
+        corrections = [None] * len(filters)
+
+        to_embed = []
+        for i, (column, value) in enumerate(filters):
+            correction, score = self.lexical_index.lookup(column=column, value=value)
+            if score >= CORRECTION_THRESHOLD:
+                corrections[i] = correction
+            else:
+                to_embed.append(i)
+
+        if len(to_embed) == 0:
+            return corrections
+
+        embeddings = self.vectorstore.embeddings.embed_documents(
+            [filters[i][1] for i in to_embed]
+        )
+
+        columns_queries = {}
+        for i, embedding in zip(to_embed, embeddings):
+            columns_queries.setdefault(filters[i][0], []).append((i, embedding))
+
+        for column, queries in columns_queries.items():
+            results = self.vectorstore._collection.query(
+                query_embeddings=[embedding for _, embedding in queries],
+                n_results=1,
+                where={"column": column},
+                include=["documents", "distances"],
+            )
+
+            for (i, _), docs, distances in zip(
+                queries, results["documents"], results["distances"]
+            ):
+                # Relevance score of the cosine distance
+                if len(docs) > 0 and 1.0 - distances[0] > CORRECTION_THRESHOLD:
+                    corrections[i] = docs[0]
+
+        return corrections
+
 
 if __name__ == "__main__":
     catalog = DBValuesCatalog()
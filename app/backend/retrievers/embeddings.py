@@ -0,0 +1,158 @@
+from typing import List, Dict
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from loguru import logger
+
+from langchain_core.embeddings import Embeddings
+
+from app.backend.registry import registry
+from app.backend.config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_SIZE
+
+CREATE_EMBEDDINGS_TABLE = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model VARCHAR(128),
+    text_hash VARCHAR(64),
+    vector BLOB,
+    size INTEGER,
+    last_access REAL,
+    PRIMARY KEY (model, text_hash)
+);
+"""
+
+
+def get_embeddings() -> "CachedEmbeddings":
+    """Returns the cached OpenAI embeddings shared by ingestion, retrieval and the correction catalog."""
+    return registry.get("embeddings")
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embeddings model with a persistent SQLite cache keyed by the model name and the hash of
+    the text, so re-indexing a document or asking the same question again skips the API call.
+    Vectors are stored as float32, least recently used entries are evicted beyond the size limit.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        db_path: str = EMBEDDING_CACHE_PATH,
+        max_size: int = EMBEDDING_CACHE_MAX_SIZE,
+    ) -> None:
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", type(embeddings).__name__)
+        self.max_size = max_size
+
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute(CREATE_EMBEDDINGS_TABLE)
+        self.lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [self._hash(text) for text in texts]
+        cached = self._load(set(hashes))
+
+        # Embed each distinct missing text once
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in cached:
+                missing.setdefault(text_hash, text)
+
+        with self.lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if len(missing) > 0:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._save(computed)
+            cached.update(computed)
+
+        return [cached[text_hash] for text_hash in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def _hash(self, text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _load(self, hashes: set) -> Dict[str, List[float]]:
+        if len(hashes) == 0:
+            return {}
+
+        hashes = list(hashes)
+        cached = {}
+        with self.lock:
+            # Stay below the SQLite limit on the number of query parameters
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start : start + 500]
+                rows = self.conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))});",
+                    (self.model, *batch),
+                ).fetchall()
+                for text_hash, vector in rows:
+                    cached[text_hash] = np.frombuffer(vector, dtype=np.float32).tolist()
+
+            if len(cached) > 0:
+                with self.conn:
+                    self.conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?;",
+                        [(time.time(), self.model, h) for h in cached],
+                    )
+
+        return cached
+
+    def _save(self, vectors: Dict[str, List[float]]):
+        rows = []
+        for text_hash, vector in vectors.items():
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((self.model, text_hash, blob, len(blob), time.time()))
+
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings(model, text_hash, vector, size, last_access) VALUES (?,?,?,?,?);",
+                rows,
+            )
+            self._evict()
+
+    def _evict(self):
+        total_size = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM embeddings;"
+        ).fetchone()[0]
+        if total_size <= self.max_size:
+            return
+
+        rows = self.conn.execute(
+            "SELECT model, text_hash, size FROM embeddings ORDER BY last_access ASC;"
+        ).fetchall()
+        evicted = []
+        for model, text_hash, size in rows:
+            if total_size <= self.max_size:
+                break
+            evicted.append((model, text_hash))
+            total_size -= size
+
+        self.conn.executemany(
+            "DELETE FROM embeddings WHERE model = ? AND text_hash = ?;", evicted
+        )
+        logger.info(f"Evicted {len(evicted)} embeddings from the cache.")
+
+
+if __name__ == "__main__":
+    embeddings = get_embeddings()
+
+    embeddings.embed_documents(["Irish domiciled ETFs", "Accumulating ETFs"])
+    embeddings.embed_query("Irish domiciled ETFs")
+
+    print(f"Hits: {embeddings.hits}, misses: {embeddings.misses}")
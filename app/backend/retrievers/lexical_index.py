@@ -0,0 +1,93 @@
+from typing import Dict, Iterable, List, Tuple
+from difflib import SequenceMatcher
+import numpy as np
+
+
+def get_trigrams(text: str) -> set:
+    padded = f"  {text.casefold()} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class _ColumnIndex:
+    def __init__(self, values: List[str]) -> None:
+        self.values = values
+        self.exact = {value: value for value in values}
+        self.casefolded = {value.casefold().strip(): value for value in values}
+
+        trigrams = [get_trigrams(value) for value in values]
+        self.vocabulary = {t: i for i, t in enumerate(sorted(set().union(*trigrams)))}
+        self.matrix = np.zeros((len(values), len(self.vocabulary)), dtype=np.float32)
+        for row, value_trigrams in enumerate(trigrams):
+            self.matrix[row, [self.vocabulary[t] for t in value_trigrams]] = 1.0
+        self.n_trigrams = self.matrix.sum(axis=1)
+
+
+class LexicalIndex:
+    """
+    In-memory index of the catalog values of each column used to correct filter values without any
+    network call: exact and case-folded lookups first, then the candidates with the highest trigram
+    Jaccard similarity (computed for all the values at once) are scored with their edit ratio.
+    """
+
+    def __init__(
+        self, values: Iterable[Tuple[str, str]], n_candidates: int = 3
+    ) -> None:
+        self.n_candidates = n_candidates
+
+        columns_values: Dict[str, List[str]] = {}
+        for column, value in values:
+            columns_values.setdefault(column, []).append(value)
+
+        self.columns = {
+            column: _ColumnIndex(values) for column, values in columns_values.items()
+        }
+
+    def lookup(self, column: str, value: str) -> Tuple[str | None, float]:
+        """Returns the closest catalog value of the column and its similarity score in [0, 1]."""
+        index = self.columns.get(column)
+        if index is None or len(index.values) == 0:
+            return None, 0.0
+
+        if value in index.exact:
+            return value, 1.0
+
+        normalized = value.casefold().strip()
+        if normalized in index.casefolded:
+            return index.casefolded[normalized], 1.0
+
+        query = np.zeros(len(index.vocabulary), dtype=np.float32)
+        query_trigrams = [
+            index.vocabulary[t]
+            for t in get_trigrams(normalized)
+            if t in index.vocabulary
+        ]
+        if len(query_trigrams) == 0:
+            return None, 0.0
+        query[query_trigrams] = 1.0
+
+        intersection = index.matrix @ query
+        union = index.n_trigrams + len(get_trigrams(normalized)) - intersection
+        jaccard = intersection / union
+
+        n_candidates = min(self.n_candidates, len(index.values))
+        candidates = np.argpartition(-jaccard, n_candidates - 1)[:n_candidates]
+
+        best_value, best_score = None, 0.0
+        for i in candidates:
+            if jaccard[i] == 0:
+                continue
+            candidate = index.values[i]
+            score = SequenceMatcher(None, normalized, candidate.casefold()).ratio()
+            if score > best_score:
+                best_value, best_score = candidate, score
+
+        return best_value, best_score
+
+
+if __name__ == "__main__":
+    index = LexicalIndex(
+        [("domicile_country", "Ireland"), ("domicile_country", "Luxembourg")]
+    )
+
+    print(index.lookup(column="domicile_country", value="ireland"))
+    print(index.lookup(column="domicile_country", value="Luxemburg"))
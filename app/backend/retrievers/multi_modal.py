@@ -8,13 +8,13 @@ from loguru import logger
 from langchain.retrievers import MultiVectorRetriever
 from langchain.storage import LocalFileStore
 from langchain_core.documents import Document
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
 
 
 from app.backend.splitters import PDFSplitter
 from app.backend.retrievers import ChromaRetriever
 from app.backend.utils import get_rand_str, compute_file_digest
-from app.backend.chains.docqa.summarize_table import create_summarize_chain
+from app.backend.registry import registry
 
 
 class SerializableLocalDocumentStore(LocalFileStore):
@@ -40,7 +40,7 @@ class MultiModalChromaRetriever(ChromaRetriever):
         chroma_store: str,
         local_store: str,
         collection: str | None = None,
-        embeddings=OpenAIEmbeddings(),
+        embeddings: Embeddings | None = None,
         top_k: int = 4,
         source_id: (
             str | None
@@ -69,87 +69,72 @@ class MultiModalChromaRetriever(ChromaRetriever):
             search_type=self.search_type,
         )
 
-        self.table_summarize_chain = create_summarize_chain()
+        self.table_summarize_chain = registry.get("table_summarize_chain")
 
     def get_retriever(self) -> BaseRetriever:
         return self.retriever
 
     def add_file(self, file_path: str, splitter: PDFSplitter) -> str:
-        docs = splitter.split(file_path=file_path)
-
+        return self.add_files(file_paths=[file_path], splitter=splitter)[0]
+
+    def add_files(self, file_paths: List[str], splitter: PDFSplitter) -> List[str]:
+        """
+        Splits all the files and indexes their chunks of every type at once: chunks are embedded in
+        concurrent batches and written with one bulk upsert to the vectorstore and one docstore mset.
+        """
+        source_ids = []
         texts, tables, images = [], [], []
-        for doc in docs:
-            doc_t = doc.metadata["doc_type"]
-            if doc_t == "text":
-                texts.append(doc)
-            elif doc_t == "table":
-                tables.append(doc)
-            elif doc_t == "image":
-                images.append(doc)
-            else:
-                logger.error(f"Doc type {doc_t} not supported!")
-                raise NotImplementedError
-
-        self._add_textual_docs(texts)
-        self._add_tables(tables)
-        self._add_images(images)
-
-        # Return the file digest as ID for all chunks created from the given source
-        return docs[0].metadata["source_id"]
-
-    def delete_source_data(self, source_id: str):
-        data = self.vectorstore.get(where={"source_id": source_id})
-        chunks_ids = data["ids"]
-        chunks_docs_ids = [md[retriever.docstore_id] for md in data["metadatas"]]
-
-        self.vectorstore.delete(ids=chunks_ids)
-        self.retriever.docstore.mdelete(keys=chunks_docs_ids)
-
-    def _add_textual_docs(self, docs: List[Document]):
-        if len(docs) == 0:
-            return
-
-        doc_ids = []
-        for doc in docs:
+        for file_path in file_paths:
+            docs = splitter.split(file_path=file_path)
+
+            for doc in docs:
+                doc_t = doc.metadata["doc_type"]
+                if doc_t == "text":
+                    texts.append(doc)
+                elif doc_t == "table":
+                    tables.append(doc)
+                elif doc_t == "image":
+                    images.append(doc)
+                else:
+                    logger.error(f"Doc type {doc_t} not supported!")
+                    raise NotImplementedError
+
+            # Return the file digest as ID for all chunks created from the given source
+            source_ids.append(docs[0].metadata["source_id"])
+
+        index_docs, stored_docs = [], []
+        for doc in texts + images:
             id = str(uuid.uuid4())
             doc.metadata[self.docstore_id] = id
-            doc_ids.append(id)
-
-        self.retriever.vectorstore.add_documents(docs)
-        self.retriever.docstore.mset(list(zip(doc_ids, docs)))
-
-    def _add_tables(self, docs: List[Document]):
-        if len(docs) == 0:
-            return
+            index_docs.append(doc)
+            stored_docs.append((id, doc))
 
-        table_summaries = self.summarize_tables([doc.page_content for doc in docs])
-
-        doc_ids = []
-        summary_docs = []
-        for i in range(len(docs)):
-            id = str(uuid.uuid4())
-            summary_doc = Document(
-                page_content=table_summaries[i], metadata=docs[i].metadata
+        # Tables are indexed through their summary but the full table is returned
+        if len(tables) > 0:
+            table_summaries = self.summarize_tables(
+                [doc.page_content for doc in tables]
             )
-            summary_doc.metadata[self.docstore_id] = id
-            doc_ids.append(id)
-            summary_docs.append(summary_doc)
-
-        self.retriever.vectorstore.add_documents(summary_docs)
-        self.retriever.docstore.mset(list(zip(doc_ids, docs)))
+            for doc, summary in zip(tables, table_summaries):
+                id = str(uuid.uuid4())
+                doc.metadata[self.docstore_id] = id
+                index_docs.append(Document(page_content=summary, metadata=doc.metadata))
+                stored_docs.append((id, doc))
+
+        self.upsert_documents(index_docs)
+        self.retriever.docstore.mset(stored_docs)
+        logger.info(
+            f"Added {len(texts)} texts, {len(tables)} tables and {len(images)} images to the database."
+        )
 
-    def _add_images(self, docs: List[Document]):
-        if len(docs) == 0:
-            return
+        return source_ids
 
-        doc_ids = []
-        for doc in docs:
-            id = str(uuid.uuid4())
-            doc.metadata[self.docstore_id] = id
-            doc_ids.append(id)
+    def delete_source_data(self, source_id: str):
+        data = self.vectorstore.get(where={"source_id": source_id})
+        chunks_ids = data["ids"]
+        chunks_docs_ids = [md[self.docstore_id] for md in data["metadatas"]]
 
-        self.retriever.vectorstore.add_documents(docs)
-        self.retriever.docstore.mset(list(zip(doc_ids, docs)))
+        self.vectorstore.delete(ids=chunks_ids)
+        self.retriever.docstore.mdelete(keys=chunks_docs_ids)
 
     def reset(self):
         super().reset()
@@ -1,4 +1,16 @@
 from .base import PDFSplitter
-from .page_split import PageSplitPDFSplitter
-from .multi_modal import MultiModalPDFSplitter
-from .page_split_multi_modal import MultiModalPageSplitPDFSplitter
\ No newline at end of file
+
+# Splitters depend on heavy packages (unstructured, layout models...), they are imported at first use
+_LAZY_IMPORTS = {
+    "PageSplitPDFSplitter": ".page_split",
+    "MultiModalPDFSplitter": ".multi_modal",
+    "MultiModalPageSplitPDFSplitter": ".page_split_multi_modal",
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_IMPORTS:
+        import importlib
+
+        return getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,147 @@
+from typing import List, Dict, Any, TYPE_CHECKING
+from dataclasses import dataclass
+import os
+import json
+import hashlib
+import pyarrow as pa
+
+# Unstructured is slow to import, it is needed only to convert freshly partitioned elements
+if TYPE_CHECKING:
+    from unstructured.documents.elements import Element
+
+SPLITTER_CACHE_VERSION = 1
+
+ELEMENTS_SCHEMA = pa.schema(
+    [
+        ("text", pa.string()),
+        ("type", pa.string()),
+        ("page", pa.int32()),
+        ("image_path", pa.string()),
+    ]
+)
+KEPT_IMAGES_SCHEMA = pa.schema([("image", pa.string())])
+
+
+@dataclass
+class ElementRecord:
+    text: str
+    type: str
+    page: int | None
+    image_path: str | None
+
+    @classmethod
+    def from_element(cls, element: "Element") -> "ElementRecord":
+        from unstructured.documents.elements import Table, CompositeElement
+
+        if isinstance(element, Table):
+            element_type = "table"
+        elif isinstance(element, CompositeElement):
+            element_type = "text"
+        else:
+            element_type = element.category.lower()
+
+        return cls(
+            text=element.text,
+            type=element_type,
+            page=element.metadata.page_number,
+            image_path=element.metadata.image_path,
+        )
+
+
+class SplitterCache:
+    """
+    Versioned cache of the elements extracted from a PDF, stored as Arrow IPC files that are memory
+    mapped when read. Each file is tagged with the schema version and with a key derived from the
+    splitter parameters, so that a parameter change never serves stale elements. Loading the
+    records still converts the Arrow columns into Python objects, the memory map only avoids
+    reading the file into an intermediate buffer.
+    """
+
+    def __init__(self, cache_dir: str, **params: Any) -> None:
+        self.cache_dir = cache_dir
+        self.key = self.make_key(**params)
+
+        self.elements_file = os.path.join(cache_dir, f"elements-{self.key}.arrow")
+        self.kept_images_file = os.path.join(cache_dir, f"kept_images-{self.key}.arrow")
+
+    @staticmethod
+    def make_key(**params: Any) -> str:
+        key_data = json.dumps(
+            {"version": SPLITTER_CACHE_VERSION, **params}, sort_keys=True
+        )
+        return hashlib.sha256(key_data.encode("utf-8")).hexdigest()[:16]
+
+    def has_elements(self) -> bool:
+        # Only the file footer with the schema metadata is read, not the record batches
+        if not os.path.exists(self.elements_file):
+            return False
+
+        with pa.memory_map(self.elements_file, "r") as source:
+            return self._is_valid(pa.ipc.open_file(source).schema)
+
+    def load_elements(self) -> List[ElementRecord] | None:
+        table = self._read(self.elements_file)
+        if table is None:
+            return None
+
+        columns = table.to_pydict()
+        return [
+            ElementRecord(*values)
+            for values in zip(
+                columns["text"], columns["type"], columns["page"], columns["image_path"]
+            )
+        ]
+
+    def save_elements(self, records: List[ElementRecord]):
+        table = pa.Table.from_pydict(
+            {
+                "text": [r.text for r in records],
+                "type": [r.type for r in records],
+                "page": [r.page for r in records],
+                "image_path": [r.image_path for r in records],
+            },
+            schema=ELEMENTS_SCHEMA,
+        )
+        self._write(self.elements_file, table)
+
+    def load_kept_images(self) -> List[str] | None:
+        table = self._read(self.kept_images_file)
+        if table is None:
+            return None
+
+        return table.column("image").to_pylist()
+
+    def save_kept_images(self, images: List[str]):
+        table = pa.Table.from_pydict({"image": images}, schema=KEPT_IMAGES_SCHEMA)
+        self._write(self.kept_images_file, table)
+
+    def _read(self, file: str) -> pa.Table | None:
+        if not os.path.exists(file):
+            return None
+
+        with pa.memory_map(file, "r") as source:
+            reader = pa.ipc.open_file(source)
+            if not self._is_valid(reader.schema):
+                return None
+
+            return reader.read_all()
+
+    def _is_valid(self, schema: pa.Schema) -> bool:
+        metadata = schema.metadata or {}
+        return (
+            metadata.get(b"version") == str(SPLITTER_CACHE_VERSION).encode()
+            and metadata.get(b"key") == self.key.encode()
+        )
+
+    def _write(self, file: str, table: pa.Table):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        table = table.replace_schema_metadata(
+            {"version": str(SPLITTER_CACHE_VERSION), "key": self.key}
+        )
+
+        # Write to a temporary file first so that readers never see a partial cache
+        tmp_file = file + ".tmp"
+        with pa.OSFile(tmp_file, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_file, file)
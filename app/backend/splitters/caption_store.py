@@ -0,0 +1,220 @@
+from typing import Tuple, List
+from dataclasses import dataclass
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+from PIL import Image
+from loguru import logger
+
+from app.backend.config import (
+    CAPTION_STORE_PATH,
+    CAPTION_STORE_MAX_ENTRIES,
+    CAPTION_STORE_MAX_SIZE,
+    CAPTION_STORE_MAX_PHASH_DISTANCE,
+)
+
+CREATE_CAPTIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS captions (
+    image_hash VARCHAR(64) PRIMARY KEY,
+    perceptual_hash INTEGER,
+    caption TEXT,
+    keep BOOLEAN,
+    size INTEGER,
+    last_access REAL
+);
+"""
+
+# Bands of the perceptual hashes of the discarded images. Two hashes within distance d share at
+# least one of d + 1 bands, so near-duplicates are found with indexed lookups instead of a scan
+CREATE_PHASH_BANDS_TABLE = """
+CREATE TABLE IF NOT EXISTS phash_bands (
+    n_bands INTEGER,
+    band INTEGER,
+    band_value INTEGER,
+    image_hash VARCHAR(64),
+    PRIMARY KEY (n_bands, band, band_value, image_hash)
+);
+"""
+
+
+@dataclass
+class CaptionEntry:
+    image_hash: str
+    caption: str
+    keep: bool | None
+
+
+def compute_image_hash(image_file: str) -> str:
+    with open(image_file, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def compute_perceptual_hash(image_file: str) -> int:
+    """64 bit difference hash (dHash) of the image, robust to re-encoding and resizing."""
+    with Image.open(image_file) as image:
+        pixels = list(image.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+
+    phash = 0
+    for row in range(8):
+        for col in range(8):
+            phash = (phash << 1) | int(
+                pixels[row * 9 + col] > pixels[row * 9 + col + 1]
+            )
+
+    # Store it as a signed 64 bit integer as required by SQLite
+    return phash - (1 << 64) if phash >= (1 << 63) else phash
+
+
+def split_perceptual_hash(phash: int, n_bands: int) -> List[int]:
+    """Splits the 64 bit hash into n_bands contiguous bands of bits."""
+    phash &= (1 << 64) - 1
+    width = -(-64 // n_bands)
+    return [(phash >> (i * width)) & ((1 << width) - 1) for i in range(n_bands)]
+
+
+class CaptionStore:
+    """
+    Content-addressed store of image captions and caption filter verdicts shared by all documents.
+    Captions are keyed by the hash of the image bytes, so the same image costs a single vision call
+    regardless of how many documents contain it. Near-duplicates found through the perceptual hash
+    only reuse discard verdicts (logos, banners...), so that a chart is never described with the
+    caption of a similar looking one. Near-duplicates are searched through an index of perceptual hash
+    bands. Least recently used entries are evicted beyond the size limits.
+    """
+
+    def __init__(
+        self,
+        db_path: str = CAPTION_STORE_PATH,
+        max_entries: int = CAPTION_STORE_MAX_ENTRIES,
+        max_size: int = CAPTION_STORE_MAX_SIZE,
+        max_phash_distance: int = CAPTION_STORE_MAX_PHASH_DISTANCE,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self.max_phash_distance = max_phash_distance
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        # At least two bands, so that each band value fits in a signed SQLite integer
+        self.n_bands = max(max_phash_distance + 1, 2)
+        with self.conn:
+            self.conn.execute(CREATE_CAPTIONS_TABLE)
+            self.conn.execute(CREATE_PHASH_BANDS_TABLE)
+            self._index_discarded()
+        self.lock = threading.Lock()
+
+    def lookup(self, image_file: str) -> Tuple[str, int, CaptionEntry | None]:
+        """Returns the image hashes and, if found, the cached entry for the image or a near-duplicate."""
+        image_hash = compute_image_hash(image_file)
+        try:
+            phash = compute_perceptual_hash(image_file)
+        except Exception:
+            phash = None
+
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT image_hash, caption, keep FROM captions WHERE image_hash = ?;",
+                (image_hash,),
+            ).fetchone()
+
+            if row is None and phash is not None and self.max_phash_distance > 0:
+                row = self._find_discarded_duplicate(phash)
+                if row is not None:
+                    logger.debug(
+                        f"Image {os.path.basename(image_file)} is a near-duplicate of a discarded image"
+                    )
+
+            if row is None:
+                return image_hash, phash, None
+
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE captions SET last_access = ? WHERE image_hash = ?;",
+                    (time.time(), row[0]),
+                )
+
+        keep = None if row[2] is None else bool(row[2])
+        return image_hash, phash, CaptionEntry(row[0], row[1], keep)
+
+    def set_caption(self, image_hash: str, phash: int | None, caption: str):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO captions(image_hash, perceptual_hash, caption, keep, size, last_access) VALUES (?,?,?,NULL,?,?);",
+                (image_hash, phash, caption, len(caption.encode("utf-8")), time.time()),
+            )
+            self._evict()
+
+    def set_verdict(self, image_hash: str, keep: bool):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "UPDATE captions SET keep = ? WHERE image_hash = ?;",
+                (keep, image_hash),
+            )
+            if not keep:
+                self._index_discarded(image_hash)
+
+    def _index_discarded(self, image_hash: str | None = None):
+        """Adds the bands of the discarded images (all of them or only the given one) to the index."""
+        query = "SELECT image_hash, perceptual_hash FROM captions WHERE keep = 0 AND perceptual_hash IS NOT NULL"
+        params = ()
+        if image_hash is not None:
+            query += " AND image_hash = ?"
+            params = (image_hash,)
+        else:
+            # Only the images not indexed yet with the current number of bands
+            query += " AND image_hash NOT IN (SELECT image_hash FROM phash_bands WHERE n_bands = ?)"
+            params = (self.n_bands,)
+
+        rows = self.conn.execute(query + ";", params).fetchall()
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO phash_bands(n_bands, band, band_value, image_hash) VALUES (?,?,?,?);",
+            [
+                (self.n_bands, band, band_value, row_hash)
+                for row_hash, phash in rows
+                for band, band_value in enumerate(
+                    split_perceptual_hash(phash, self.n_bands)
+                )
+            ],
+        )
+
+    def _find_discarded_duplicate(self, phash: int) -> Tuple | None:
+        bands = split_perceptual_hash(phash, self.n_bands)
+        conditions = " OR ".join(["(b.band = ? AND b.band_value = ?)"] * len(bands))
+        rows: List = self.conn.execute(
+            "SELECT DISTINCT c.image_hash, c.caption, c.keep, c.perceptual_hash FROM phash_bands b "
+            "JOIN captions c ON c.image_hash = b.image_hash "
+            f"WHERE b.n_bands = ? AND ({conditions}) AND c.keep = 0 AND c.perceptual_hash IS NOT NULL;",
+            [self.n_bands] + [value for band in enumerate(bands) for value in band],
+        ).fetchall()
+
+        for row in rows:
+            if (
+                (row[3] ^ phash) & ((1 << 64) - 1)
+            ).bit_count() <= self.max_phash_distance:
+                return row[:3]
+
+        return None
+
+    def _evict(self):
+        n_entries, total_size = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM captions;"
+        ).fetchone()
+        if n_entries <= self.max_entries and total_size <= self.max_size:
+            return
+
+        rows = self.conn.execute(
+            "SELECT image_hash, size FROM captions ORDER BY last_access ASC;"
+        ).fetchall()
+        evicted = []
+        for image_hash, size in rows:
+            if n_entries <= self.max_entries and total_size <= self.max_size:
+                break
+            evicted.append((image_hash,))
+            n_entries -= 1
+            total_size -= size
+
+        self.conn.executemany("DELETE FROM captions WHERE image_hash = ?;", evicted)
+        self.conn.executemany("DELETE FROM phash_bands WHERE image_hash = ?;", evicted)
+        logger.info(f"Evicted {len(evicted)} captions from the store.")
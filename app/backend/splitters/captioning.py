@@ -0,0 +1,228 @@
+from typing import List
+from dataclasses import dataclass
+import os
+import asyncio
+from loguru import logger
+from tqdm import tqdm
+
+from app.backend.chains.docqa import ImageCaptioningChain, CaptionFilterChain
+from app.backend.splitters.caption_store import CaptionStore
+from app.backend.rate_limit import AsyncTokenBucket, retry_with_backoff
+from app.backend.utils import encode_image
+from app.backend.config import (
+    CAPTIONING_MAX_CONCURRENCY,
+    CAPTIONING_REQUESTS_PER_SECOND,
+    CAPTIONING_MAX_RETRIES,
+)
+
+
+@dataclass
+class CaptionedImage:
+    image_file: str
+    caption: str
+    keep: bool | None = None
+
+
+class ImageCaptioningPipeline:
+    """
+    Captions images concurrently, with a bound on the requests in flight, a token bucket limiting
+    the request rate of each model and retries with exponential backoff. When filtering is enabled
+    each caption is passed to the filter chain as soon as it is generated. Captions and verdicts are
+    looked up in and saved to the content-addressed caption store.
+    """
+
+    def __init__(
+        self,
+        captioning_chain: ImageCaptioningChain | None = None,
+        filter_chain: CaptionFilterChain | None = None,
+        caption_store: CaptionStore | None = None,
+        max_concurrency: int = CAPTIONING_MAX_CONCURRENCY,
+        requests_per_second: float = CAPTIONING_REQUESTS_PER_SECOND,
+        max_retries: int = CAPTIONING_MAX_RETRIES,
+    ) -> None:
+        self.captioning_chain = captioning_chain
+        self.filter_chain = filter_chain
+        self.caption_store = caption_store
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+
+    def run(
+        self,
+        image_files: List[str],
+        filter_captions: bool = False,
+    ) -> List[CaptionedImage]:
+        return asyncio.run(
+            self.arun(image_files=image_files, filter_captions=filter_captions)
+        )
+
+    def filter(self, captioned_images: List[CaptionedImage]) -> List[CaptionedImage]:
+        return asyncio.run(self.afilter(captioned_images))
+
+    async def arun(
+        self,
+        image_files: List[str],
+        filter_captions: bool = False,
+    ) -> List[CaptionedImage]:
+        if self.caption_store is None:
+            self.caption_store = CaptionStore()
+        if self.captioning_chain is None:
+            self.captioning_chain = ImageCaptioningChain()
+        if filter_captions and self.filter_chain is None:
+            self.filter_chain = CaptionFilterChain()
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        captioning_bucket = AsyncTokenBucket(rate=self.requests_per_second)
+        filter_bucket = AsyncTokenBucket(rate=self.requests_per_second)
+        pending = {}
+
+        async def process(image_file: str) -> CaptionedImage:
+            # Hashing the image and querying the store block, keep them off the event loop
+            image_hash, phash, entry = await asyncio.to_thread(
+                self.caption_store.lookup, image_file
+            )
+
+            # Identical images in the same batch are processed only once
+            if image_hash in pending:
+                image = await pending[image_hash]
+                return CaptionedImage(image_file, image.caption, image.keep)
+            future = asyncio.get_running_loop().create_future()
+            pending[image_hash] = future
+
+            try:
+                image = await process_new(image_file, image_hash, phash, entry)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                future.set_exception(e)
+                # The error is raised below, mark it as retrieved in case no duplicate awaits it
+                future.exception()
+                raise
+            future.set_result(image)
+            return image
+
+        async def process_new(image_file, image_hash, phash, entry) -> CaptionedImage:
+            if entry is not None and entry.image_hash != image_hash:
+                # Near-duplicate of a discarded image, whose caption describes a different image.
+                # Its discard verdict is reused when filtering, otherwise the image is captioned
+                if filter_captions:
+                    return CaptionedImage(image_file=image_file, caption="", keep=False)
+                entry = None
+
+            if entry is not None:
+                # Cached verdicts are reported only when filtering is requested
+                caption = entry.caption
+                keep = entry.keep if filter_captions else None
+            else:
+                caption = await self._caption(image_file, semaphore, captioning_bucket)
+                await asyncio.to_thread(
+                    self.caption_store.set_caption, image_hash, phash, caption
+                )
+                keep = None
+
+            if filter_captions and keep is None:
+                keep = await self._request(
+                    lambda: self.filter_chain.arun(caption=caption),
+                    semaphore,
+                    filter_bucket,
+                )
+                await asyncio.to_thread(
+                    self.caption_store.set_verdict,
+                    entry.image_hash if entry else image_hash,
+                    keep,
+                )
+
+            return CaptionedImage(image_file=image_file, caption=caption, keep=keep)
+
+        logger.info(f"Generating/loading image captions...")
+        results = await self._gather(
+            [process(image_file) for image_file in image_files]
+        )
+
+        if filter_captions:
+            logger.info(
+                f"{len([r for r in results if r.keep])} images have been kept out of {len(results)}."
+            )
+        return results
+
+    async def afilter(
+        self, captioned_images: List[CaptionedImage]
+    ) -> List[CaptionedImage]:
+        if self.caption_store is None:
+            self.caption_store = CaptionStore()
+        if self.filter_chain is None:
+            self.filter_chain = CaptionFilterChain()
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        filter_bucket = AsyncTokenBucket(rate=self.requests_per_second)
+
+        async def process(image: CaptionedImage) -> CaptionedImage:
+            image_hash, phash, entry = await asyncio.to_thread(
+                self.caption_store.lookup, image.image_file
+            )
+            if entry is not None and entry.keep is not None:
+                image.keep = entry.keep
+                return image
+
+            image.keep = await self._request(
+                lambda: self.filter_chain.arun(caption=image.caption),
+                semaphore,
+                filter_bucket,
+            )
+            if entry is None:
+                await asyncio.to_thread(
+                    self.caption_store.set_caption, image_hash, phash, image.caption
+                )
+            await asyncio.to_thread(
+                self.caption_store.set_verdict,
+                entry.image_hash if entry else image_hash,
+                image.keep,
+            )
+            return image
+
+        logger.info(f"Filtering out irrelevant images based on their captions...")
+        results = await self._gather([process(image) for image in captioned_images])
+        return [image for image in results if image.keep]
+
+    async def _caption(
+        self,
+        image_file: str,
+        semaphore: asyncio.Semaphore,
+        bucket: AsyncTokenBucket,
+    ) -> str:
+        image_b64 = encode_image(image_file)
+        logger.debug(
+            f"Computing caption with GPT-4V for image {os.path.basename(image_file)}"
+        )
+        return await self._request(
+            lambda: self.captioning_chain.arun(image_b64=image_b64), semaphore, bucket
+        )
+
+    async def _request(
+        self, func, semaphore: asyncio.Semaphore, bucket: AsyncTokenBucket
+    ):
+        # Every attempt takes a token and a slot, backoff sleeps happen outside the semaphore so
+        # that retries don't starve the other requests
+        async def attempt():
+            async with semaphore:
+                await bucket.acquire()
+                return await func()
+
+        return await retry_with_backoff(attempt, max_retries=self.max_retries)
+
+    @staticmethod
+    async def _gather(coros: List) -> List:
+        """Awaits all coroutines showing their progress, results are returned in input order."""
+        tasks = [asyncio.ensure_future(coro) for coro in coros]
+        try:
+            for task in tqdm(asyncio.as_completed(tasks), total=len(tasks)):
+                await task
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Retrieve the outcome of every task, so that the failures of the ones not awaited
+            # above are not reported as never retrieved
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        return [task.result() for task in tasks]
@@ -0,0 +1,159 @@
+from typing import List, Dict, Tuple
+from dataclasses import dataclass
+import os
+import numpy as np
+from PIL import Image
+from loguru import logger
+
+from app.backend.splitters.caption_store import compute_perceptual_hash
+from app.backend.config import (
+    PREFILTER_MIN_SIDE,
+    PREFILTER_MIN_AREA,
+    PREFILTER_MAX_ASPECT_RATIO,
+    PREFILTER_MIN_ENTROPY,
+    PREFILTER_MIN_EDGE_DENSITY,
+    PREFILTER_MAX_REPEATS,
+    CAPTION_STORE_MAX_PHASH_DISTANCE,
+)
+
+STATS_MAX_SIDE = 512
+EDGE_THRESHOLD = 40
+
+
+@dataclass
+class ImageStats:
+    width: int
+    height: int
+    entropy: float
+    edge_density: float
+    phash: int
+
+
+class ImagePreFilter:
+    """
+    Cheap, CPU-only filter discarding images that are obviously not informative (logos, banners,
+    icons, repeated branding) before they reach the captioning models. It only looks at the image
+    size and aspect ratio, at the entropy of its grayscale histogram, at its edge density and at
+    near-duplicates among the images of the same document.
+    """
+
+    def __init__(
+        self,
+        min_side: int = PREFILTER_MIN_SIDE,
+        min_area: int = PREFILTER_MIN_AREA,
+        max_aspect_ratio: float = PREFILTER_MAX_ASPECT_RATIO,
+        min_entropy: float = PREFILTER_MIN_ENTROPY,
+        min_edge_density: float = PREFILTER_MIN_EDGE_DENSITY,
+        max_repeats: int = PREFILTER_MAX_REPEATS,
+        max_phash_distance: int = CAPTION_STORE_MAX_PHASH_DISTANCE,
+    ) -> None:
+        self.min_side = min_side
+        self.min_area = min_area
+        self.max_aspect_ratio = max_aspect_ratio
+        self.min_entropy = min_entropy
+        self.min_edge_density = min_edge_density
+        self.max_repeats = max_repeats
+        self.max_phash_distance = max_phash_distance
+
+    def filter(self, image_files: List[str]) -> List[str]:
+        stats: Dict[str, ImageStats] = {}
+        for image_file in image_files:
+            try:
+                stats[image_file] = self.compute_stats(image_file)
+            except Exception as e:
+                logger.warning(f"Failed to analyze image {image_file}: {e}")
+
+        kept_images = []
+        for image_file, image_stats in stats.items():
+            relevant, reason = self.is_relevant(image_stats)
+            if relevant:
+                kept_images.append(image_file)
+            else:
+                logger.debug(
+                    f"Discarded image {os.path.basename(image_file)}: {reason}"
+                )
+
+        kept_images = self._remove_duplicates(kept_images, stats)
+
+        logger.info(
+            f"Pre-filter kept {len(kept_images)} images out of {len(image_files)}."
+        )
+        return kept_images
+
+    def is_relevant(self, stats: ImageStats) -> Tuple[bool, str | None]:
+        if min(stats.width, stats.height) < self.min_side:
+            return False, "too small"
+        if stats.width * stats.height < self.min_area:
+            return False, "too small"
+
+        aspect_ratio = max(stats.width, stats.height) / min(stats.width, stats.height)
+        if aspect_ratio > self.max_aspect_ratio:
+            return False, "banner-like aspect ratio"
+
+        # Flat images with few edges are logos or solid blocks, plots have axes, ticks and labels
+        if (
+            stats.entropy < self.min_entropy
+            and stats.edge_density < self.min_edge_density
+        ):
+            return False, "flat image"
+
+        return True, None
+
+    @staticmethod
+    def compute_stats(image_file: str) -> ImageStats:
+        with Image.open(image_file) as image:
+            width, height = image.size
+            gray = image.convert("L")
+            gray.thumbnail((STATS_MAX_SIDE, STATS_MAX_SIDE))
+            pixels = np.asarray(gray, dtype=np.int16)
+
+        hist = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+        p = hist[hist > 0] / hist.sum()
+        entropy = float(-(p * np.log2(p)).sum())
+
+        if pixels.shape[0] > 1 and pixels.shape[1] > 1:
+            gx = np.abs(np.diff(pixels, axis=1))[:-1, :]
+            gy = np.abs(np.diff(pixels, axis=0))[:, :-1]
+            edge_density = float(((gx + gy) > EDGE_THRESHOLD).mean())
+        else:
+            edge_density = 0.0
+
+        return ImageStats(
+            width=width,
+            height=height,
+            entropy=entropy,
+            edge_density=edge_density,
+            phash=compute_perceptual_hash(image_file),
+        )
+
+    def _remove_duplicates(
+        self, image_files: List[str], stats: Dict[str, ImageStats]
+    ) -> List[str]:
+        """
+        Groups near-duplicate images: groups repeated on many pages are branding and are discarded,
+        otherwise only the first image of each group is kept.
+        """
+        groups: List[List[str]] = []
+        for image_file in image_files:
+            for group in groups:
+                distance = (
+                    (stats[group[0]].phash ^ stats[image_file].phash) & ((1 << 64) - 1)
+                ).bit_count()
+                if distance <= self.max_phash_distance:
+                    group.append(image_file)
+                    break
+            else:
+                groups.append([image_file])
+
+        kept_images = []
+        for group in groups:
+            # Images are saved by unstructured as <type>-<page>-<n>.jpg
+            pages = set(os.path.basename(f).split("-")[1] for f in group)
+            if len(pages) >= self.max_repeats:
+                logger.debug(
+                    f"Discarded image {os.path.basename(group[0])}: repeated on {len(pages)} pages"
+                )
+                continue
+            kept_images.append(group[0])
+
+        return kept_images
@@ -1,19 +1,130 @@
-from typing import Optional, List, Dict
-import pickle
+from typing import Optional, List, Dict, Tuple
 import os
+import math
 from glob import glob
 import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import fitz
 from loguru import logger
-from tqdm import tqdm
 
-from unstructured.partition.pdf import partition_pdf
-from unstructured.documents.elements import Table, CompositeElement
 from langchain_core.documents import Document
 
 from app.backend.splitters import PDFSplitter
-from app.backend.chains.docqa import ImageCaptioningChain, CaptionFilterChain
+from app.backend.splitters.cache import SplitterCache, ElementRecord
+from app.backend.splitters.captioning import ImageCaptioningPipeline, CaptionedImage
+from app.backend.splitters.image_filter import ImagePreFilter
+
+from app.backend.utils import get_rand_str, compute_file_digest
+from app.backend.config import IMAGE_PAGE_MIN_DRAWINGS
+
+# Unstructured and its layout model dependencies take seconds to import, they are imported only
+# by the functions actually running the partitioning
+
+IMAGE_BLOCK_TYPES = ["Image", "Picture", "Figure"]
+LAYOUT_MODEL = "yolox_quantized"
+
+
+def find_image_pages(pdf: fitz.Document) -> List[int]:
+    """
+    Cheaply finds the (1-based) pages of the PDF that contain raster images or a relevant amount of
+    vector drawings (e.g. plots), i.e. the only pages where the layout model can find a figure.
+    """
+    image_pages = []
+    for page in pdf:
+        if len(page.get_images()) > 0:
+            image_pages.append(page.number + 1)
+        elif (
+            IMAGE_PAGE_MIN_DRAWINGS > 0
+            and len(page.get_drawings()) >= IMAGE_PAGE_MIN_DRAWINGS
+        ):
+            image_pages.append(page.number + 1)
+
+    return image_pages
+
+
+def partition_pdf_pages(
+    pdf: fitz.Document,
+    pages: List[int],
+    work_dir: str,
+    images_folder: str | bool = False,
+    **partition_kwargs,
+) -> List:
+    """
+    Runs unstructured partition_pdf only over the given (1-based) pages of the PDF. The pages are
+    copied into a temporary PDF and, once partitioned, page numbers of the elements and of the
+    extracted images are mapped back to the ones of the original document.
+    """
+    from unstructured.partition.pdf import partition_pdf
+
+    pages_file = os.path.join(
+        work_dir, f"pages-{pages[0]}-{pages[-1]}-{get_rand_str(n=6).lower()}.pdf"
+    )
+    staging_folder = os.path.splitext(pages_file)[0] if images_folder else False
+
+    with fitz.open() as pages_pdf:
+        for page in pages:
+            pages_pdf.insert_pdf(pdf, from_page=page - 1, to_page=page - 1)
+        pages_pdf.save(pages_file)
+
+    try:
+        elements = partition_pdf(
+            filename=pages_file,
+            extract_images_in_pdf=bool(images_folder),
+            extract_image_block_types=IMAGE_BLOCK_TYPES,
+            extract_image_block_to_payload=False,
+            extract_image_block_output_dir=staging_folder,
+            **partition_kwargs,
+        )
 
-from app.backend.utils import get_rand_str, encode_image, compute_file_digest
+        renamed_images = {}
+        if staging_folder and os.path.exists(staging_folder):
+            for image_file in os.listdir(staging_folder):
+                # Images are saved by unstructured as <type>-<page>-<n>.jpg
+                block_type, page, n = os.path.splitext(image_file)[0].split("-")
+                new_image_file = os.path.join(
+                    images_folder, f"{block_type}-{pages[int(page) - 1]}-{n}.jpg"
+                )
+                shutil.move(os.path.join(staging_folder, image_file), new_image_file)
+                renamed_images[os.path.join(staging_folder, image_file)] = (
+                    new_image_file
+                )
+    finally:
+        os.remove(pages_file)
+        if staging_folder and os.path.exists(staging_folder):
+            shutil.rmtree(staging_folder)
+
+    for element in elements:
+        if element.metadata.page_number is not None:
+            element.metadata.page_number = pages[element.metadata.page_number - 1]
+        if element.metadata.image_path in renamed_images:
+            element.metadata.image_path = renamed_images[element.metadata.image_path]
+
+    return elements
+
+
+def _init_layout_worker(model_name: str):
+    # Load the layout model once per worker, unstructured caches it for all the following calls
+    from unstructured_inference.models.base import get_model
+
+    get_model(model_name)
+
+
+def _partition_pdf_shard(
+    file_path: str,
+    pages: List[int],
+    work_dir: str,
+    images_folder: str | bool,
+    partition_kwargs: Dict,
+) -> List:
+    with fitz.open(file_path) as pdf:
+        return partition_pdf_pages(
+            pdf=pdf,
+            pages=pages,
+            work_dir=work_dir,
+            images_folder=images_folder,
+            **partition_kwargs,
+        )
 
 
 class MultiModalPDFSplitter(PDFSplitter):
@@ -25,6 +136,8 @@ class MultiModalPDFSplitter(PDFSplitter):
         extract_images: bool = False,
         filter_captions: bool = True,
         force_new: bool = False,
+        n_workers: int = 1,
+        prefilter_images: bool = True,
     ) -> None:
 
         self.max_chunk_size = max_chunk_size
@@ -32,48 +145,47 @@ class MultiModalPDFSplitter(PDFSplitter):
         self.extract_images = extract_images
         self.work_dir = work_dir
         self.force_new = force_new
+        # With more than one worker the layout model runs in parallel over page shards
+        self.n_workers = n_workers
 
         self.filter_captions = filter_captions
+        # Discard obvious logos and banners locally before any captioning call
+        self.prefilter_images = prefilter_images
 
     def split(self, file_path: str) -> List[Document]:
         file_digest = compute_file_digest(file_path)
 
         file_work_dir = os.path.join(self.work_dir, file_digest)
-        elements_file = os.path.join(file_work_dir, "elements.pkl")
-
-        # Backup existing data before overwriting them
-        if os.path.exists(elements_file) and self.force_new:
-            file_work_dir_backup = os.path.join(
-                self.work_dir,
-                "backup",
-                file_digest,
-                get_rand_str(n=6).lower(),
-            )
-            shutil.move(file_work_dir, file_work_dir_backup)
-            logger.info(f"Moved existing files to {file_work_dir_backup}")
-
-        os.makedirs(file_work_dir, exist_ok=True)
-
-        if self.extract_images:
-            images_folder = os.path.join(file_work_dir, "images")
-            captions_folder = os.path.join(file_work_dir, "captions")
-            os.makedirs(images_folder, exist_ok=True)
-            os.makedirs(captions_folder, exist_ok=True)
-        else:
-            images_folder = False
+        cache = SplitterCache(
+            cache_dir=file_work_dir,
+            max_chunk_size=self.max_chunk_size,
+            min_chunk_size=self.min_chunk_size,
+            extract_images=self.extract_images,
+            prefilter_images=self.prefilter_images,
+        )
+        images_folder = self._prepare_work_dir(file_work_dir=file_work_dir, cache=cache)
 
-        if os.path.exists(elements_file):
+        pdf_elements = cache.load_elements()
+        if pdf_elements is not None:
             logger.info(f"Found pre-computed pdf elements")
-            with open(elements_file, "rb") as f:
-                pdf_elements = pickle.load(f)
+        elif self.n_workers > 1:
+            pdf_elements = self._partition_sharded(
+                file_path=file_path,
+                file_work_dir=file_work_dir,
+                images_folder=images_folder,
+            )
+            pdf_elements = [ElementRecord.from_element(e) for e in pdf_elements]
+            cache.save_elements(pdf_elements)
         else:
             logger.info(f"Extracting elements from pdf with Unstructured...")
+            from unstructured.partition.pdf import partition_pdf
+
             pdf_elements = partition_pdf(
                 strategy="hi_res",
-                hi_res_model_name="yolox_quantized",
+                hi_res_model_name=LAYOUT_MODEL,
                 filename=file_path,
                 extract_images_in_pdf=self.extract_images,
-                extract_image_block_types=["Image", "Picture", "Figure"],
+                extract_image_block_types=IMAGE_BLOCK_TYPES,
                 extract_image_block_to_payload=False,
                 infer_table_structure=True,
                 chunking_strategy="by_title",
@@ -85,121 +197,221 @@ class MultiModalPDFSplitter(PDFSplitter):
                 combine_text_under_n_chars=self.min_chunk_size,
                 extract_image_block_output_dir=images_folder,
             )
-
-            with open(elements_file, "wb") as f:
-                pickle.dump(pdf_elements, f)
+            pdf_elements = [ElementRecord.from_element(e) for e in pdf_elements]
+            cache.save_elements(pdf_elements)
 
         logger.info(f"Found {len(pdf_elements)} elements in the pdf.")
 
         docs = []
         for element in pdf_elements:
 
-            if isinstance(element, Table):
-                doc_type = "table"
-            elif isinstance(element, CompositeElement):
-                doc_type = "text"
-            else:
-                logger.error(f"Element {type(element)} not supported!")
+            if element.type not in ["table", "text"]:
+                logger.error(f"Element {element.type} not supported!")
                 raise NotImplementedError
 
             docs.append(
                 Document(
                     page_content=element.text,
                     metadata={
-                        "doc_type": doc_type,
-                        "page": element.metadata.page_number,
+                        "doc_type": element.type,
+                        "page": element.page,
                         "source_id": file_digest,
                     },
                 )
             )
 
         if self.extract_images:
-            images_with_captions = self.caption_images(
-                images_folder=images_folder, captions_folder=captions_folder
+            docs.extend(
+                self.make_image_docs(
+                    file_digest=file_digest,
+                    cache=cache,
+                    images_folder=images_folder,
+                )
             )
 
-            filtered_images_file = os.path.join(file_work_dir, "filtered_images.pkl")
-            if self.filter_captions:
-                if os.path.exists(filtered_images_file):
-                    with open(filtered_images_file, "rb") as f:
-                        images_list = pickle.load(f)
-
-                    images_list = [os.path.basename(i) for i in images_list]
-                    images_with_captions = {
-                        k: v
-                        for k, v in images_with_captions.items()
-                        if os.path.basename(k) in images_list
-                    }
-                    logger.info(
-                        f"Loaded list of captions to keep {len(images_with_captions)}"
-                    )
-                else:
-                    images_with_captions = self.filter_images_from_their_caption(
-                        images_with_captions
-                    )
-                    with open(filtered_images_file, "wb") as f:
-                        pickle.dump(list(images_with_captions.keys()), f)
-
-            for file, caption in images_with_captions.items():
-                docs.append(
-                    Document(
-                        page_content=caption,
-                        metadata={
-                            "doc_type": "image",
-                            "page": int(
-                                os.path.basename(file).split(".")[0].split("-")[1]
-                            ),
-                            "source_id": file_digest,  # doc file
-                            "image_file": file,  # single image extracted from the doc
-                        },
-                    )
+        return docs
+
+    def _partition_sharded(
+        self, file_path: str, file_work_dir: str, images_folder: str | bool
+    ) -> List:
+        """
+        Splits the PDF into page ranges and runs the layout model over them in a pool of processes,
+        each one holding its own model instance. Elements are merged back in page order and only
+        then chunked by title.
+        """
+        from unstructured.chunking.title import chunk_by_title
+
+        with fitz.open(file_path) as pdf:
+            n_pages = pdf.page_count
+
+        pages_per_shard = math.ceil(n_pages / self.n_workers)
+        shards = [
+            list(range(start, min(start + pages_per_shard, n_pages + 1)))
+            for start in range(1, n_pages + 1, pages_per_shard)
+        ]
+        partition_kwargs = {
+            "strategy": "hi_res",
+            "hi_res_model_name": LAYOUT_MODEL,
+            "infer_table_structure": True,
+        }
+
+        logger.info(
+            f"Extracting elements from pdf with Unstructured over {len(shards)} shards of {pages_per_shard} pages..."
+        )
+        with ProcessPoolExecutor(
+            max_workers=min(self.n_workers, len(shards)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_layout_worker,
+            initargs=(LAYOUT_MODEL,),
+        ) as executor:
+            shards_elements = executor.map(
+                _partition_pdf_shard,
+                [file_path] * len(shards),
+                shards,
+                [file_work_dir] * len(shards),
+                [images_folder] * len(shards),
+                [partition_kwargs] * len(shards),
+            )
+            elements = [e for shard_elements in shards_elements for e in shard_elements]
+
+        return chunk_by_title(
+            elements,
+            multipage_sections=False,
+            max_characters=self.max_chunk_size,
+            combine_text_under_n_chars=self.min_chunk_size,
+        )
+
+    def split_image_pages(self, pdf: fitz.Document, file_digest: str) -> List[Document]:
+        """
+        Extracts, captions and filters only the images of an already opened PDF. The layout model
+        is run exclusively over the pages that contain images and no text chunk is generated.
+        """
+        file_work_dir = os.path.join(self.work_dir, file_digest, "image_pages")
+        cache = SplitterCache(
+            cache_dir=file_work_dir,
+            extract_images=self.extract_images,
+            image_page_min_drawings=IMAGE_PAGE_MIN_DRAWINGS,
+            prefilter_images=self.prefilter_images,
+        )
+        images_folder = self._prepare_work_dir(file_work_dir=file_work_dir, cache=cache)
+
+        if not cache.has_elements():
+            image_pages = find_image_pages(pdf)
+            logger.info(
+                f"Extracting images from {len(image_pages)} out of {pdf.page_count} pages with Unstructured..."
+            )
+            pdf_elements = []
+            if len(image_pages) > 0:
+                pdf_elements = partition_pdf_pages(
+                    pdf=pdf,
+                    pages=image_pages,
+                    work_dir=file_work_dir,
+                    images_folder=images_folder,
+                    strategy="hi_res",
+                    hi_res_model_name=LAYOUT_MODEL,
                 )
+            cache.save_elements([ElementRecord.from_element(e) for e in pdf_elements])
 
-        return docs
+        return self.make_image_docs(
+            file_digest=file_digest,
+            cache=cache,
+            images_folder=images_folder,
+        )
 
-    @staticmethod
-    def caption_images(images_folder: str, captions_folder: str) -> Dict[str, str]:
-        captioning_chain = ImageCaptioningChain()
-
-        images_with_captions = {}
-        logger.info(f"Generating/loading image captions...")
-        for image_file in tqdm(glob(os.path.join(images_folder, "*.jpg"))):
-            caption_file = os.path.join(
-                captions_folder, os.path.basename(image_file).split(".")[0] + ".txt"
+    def _prepare_work_dir(self, file_work_dir: str, cache: SplitterCache) -> str | bool:
+        # Backup existing data before overwriting them
+        if os.path.exists(cache.elements_file) and self.force_new:
+            file_work_dir_backup = os.path.join(
+                self.work_dir,
+                "backup",
+                os.path.relpath(file_work_dir, self.work_dir),
+                get_rand_str(n=6).lower(),
             )
+            shutil.move(file_work_dir, file_work_dir_backup)
+            logger.info(f"Moved existing files to {file_work_dir_backup}")
+
+        os.makedirs(file_work_dir, exist_ok=True)
+
+        if self.extract_images:
+            images_folder = os.path.join(file_work_dir, "images")
+            os.makedirs(images_folder, exist_ok=True)
+        else:
+            images_folder = False
+
+        return images_folder
+
+    def make_image_docs(
+        self,
+        file_digest: str,
+        cache: SplitterCache,
+        images_folder: str,
+    ) -> List[Document]:
+        image_files = sorted(glob(os.path.join(images_folder, "*.jpg")))
+        if self.prefilter_images:
+            image_files = ImagePreFilter().filter(image_files)
+
+        kept_images = cache.load_kept_images() if self.filter_captions else None
+        captioned_images = ImageCaptioningPipeline().run(
+            image_files=image_files,
+            filter_captions=self.filter_captions and kept_images is None,
+        )
 
-            # Backup/load pre-computed captions since they are relatively expensive
-            if os.path.exists(caption_file):
-                with open(caption_file, "r") as f:
-                    caption = f.read()
+        if self.filter_captions:
+            if kept_images is not None:
+                captioned_images = [
+                    image
+                    for image in captioned_images
+                    if os.path.basename(image.image_file) in kept_images
+                ]
+                logger.info(f"Loaded list of captions to keep {len(captioned_images)}")
             else:
-                image_b64 = encode_image(image_file)
-                logger.debug(
-                    f"Computing caption with GPT-4V for image {os.path.basename(image_file)}"
+                captioned_images = [image for image in captioned_images if image.keep]
+                cache.save_kept_images(
+                    [os.path.basename(image.image_file) for image in captioned_images]
                 )
-                caption = captioning_chain.run(image_b64=image_b64)
-                with open(caption_file, "w") as f:
-                    f.write(caption)
 
-            images_with_captions[image_file] = caption
+        docs = []
+        for image in captioned_images:
+            docs.append(
+                Document(
+                    page_content=image.caption,
+                    metadata={
+                        "doc_type": "image",
+                        "page": int(
+                            os.path.basename(image.image_file)
+                            .split(".")[0]
+                            .split("-")[1]
+                        ),
+                        "source_id": file_digest,  # doc file
+                        "image_file": image.image_file,  # single image extracted from the doc
+                    },
+                )
+            )
 
-        return images_with_captions
+        return docs
+
+    @staticmethod
+    def caption_images(images_folder: str) -> Dict[str, str]:
+        captioned_images = ImageCaptioningPipeline().run(
+            image_files=glob(os.path.join(images_folder, "*.jpg")),
+        )
+
+        return {image.image_file: image.caption for image in captioned_images}
 
     @staticmethod
     def filter_images_from_their_caption(
-        images_with_captions: Dict[str, str]
+        images_with_captions: Dict[str, str],
     ) -> Dict[str, str]:
-        filter_chain = CaptionFilterChain()
-
-        filtered_captions = {}
-        logger.info(f"Filtering out irrelevant images based on their captions...")
-        for k, v in tqdm(images_with_captions.items()):
-            if filter_chain.run(caption=v):
-                filtered_captions[k] = v
+        filtered_images = ImageCaptioningPipeline().filter(
+            [
+                CaptionedImage(image_file=k, caption=v)
+                for k, v in images_with_captions.items()
+            ]
+        )
         logger.info(
-            f"{len(filtered_captions)} images have been kept out of {len(images_with_captions)}."
+            f"{len(filtered_images)} images have been kept out of {len(images_with_captions)}."
         )
-        return filtered_captions
+        return {image.image_file: image.caption for image in filtered_images}
 
 
 if __name__ == "__main__":
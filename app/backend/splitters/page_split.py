@@ -1,5 +1,5 @@
 from typing import List
-from langchain_community.document_loaders.pdf import PyMuPDFLoader
+import fitz
 from langchain_core.documents import Document
 
 from app.backend.splitters.base import PDFSplitter
@@ -12,12 +12,38 @@ class PageSplitPDFSplitter(PDFSplitter):
     def split(self, file_path: str) -> List[Document]:
         file_digest = compute_file_digest(file_path)
 
-        pages = PyMuPDFLoader(file_path).load()
+        with fitz.open(file_path) as pdf:
+            pages = self.split_pages(
+                pdf=pdf, file_path=file_path, file_digest=file_digest
+            )
 
-        for page in pages:
-            page.metadata["doc_type"] = "text"
-            page.metadata["page"] += 1  # correct counting from zero
-            page.metadata["source_id"] = file_digest
+        return pages
+
+    @staticmethod
+    def split_pages(
+        pdf: fitz.Document, file_path: str, file_digest: str
+    ) -> List[Document]:
+        """Creates a document for each page of an already opened PDF."""
+        pdf_metadata = {
+            k: v for k, v in pdf.metadata.items() if isinstance(v, (str, int))
+        }
+
+        pages = []
+        for page in pdf:
+            pages.append(
+                Document(
+                    page_content=page.get_text(),
+                    metadata={
+                        "source": file_path,
+                        "file_path": file_path,
+                        "page": page.number + 1,  # correct counting from zero
+                        "total_pages": pdf.page_count,
+                        **pdf_metadata,
+                        "doc_type": "text",
+                        "source_id": file_digest,
+                    },
+                )
+            )
 
         return pages
 
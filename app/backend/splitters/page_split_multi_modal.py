@@ -1,10 +1,12 @@
 from typing import List
+import fitz
 from loguru import logger
 
 from langchain_core.documents import Document
 
 from app.backend.splitters.page_split import PageSplitPDFSplitter
 from app.backend.splitters.multi_modal import MultiModalPDFSplitter
+from app.backend.utils import compute_file_digest
 
 
 class MultiModalPageSplitPDFSplitter(PageSplitPDFSplitter, MultiModalPDFSplitter):
@@ -13,6 +15,9 @@ class MultiModalPageSplitPDFSplitter(PageSplitPDFSplitter, MultiModalPDFSplitter
     containing all the textual components found in that page, additionally images are extracted,
     captioned and filtered and an additional document is returned with the caption of relevant images
     such as plots and graphs.
+
+    With single_pass the PDF is parsed only once: page texts and images are both taken from the same
+    PyMuPDF document and the layout model only runs over the pages that contain images.
     """
 
     def __init__(
@@ -21,6 +26,8 @@ class MultiModalPageSplitPDFSplitter(PageSplitPDFSplitter, MultiModalPDFSplitter
         extract_images: bool = False,
         filter_captions: bool = True,
         force_new: bool = False,
+        single_pass: bool = False,
+        prefilter_images: bool = True,
     ) -> None:
         super().__init__(
             work_dir,
@@ -29,9 +36,14 @@ class MultiModalPageSplitPDFSplitter(PageSplitPDFSplitter, MultiModalPDFSplitter
             extract_images=extract_images,
             filter_captions=filter_captions,
             force_new=force_new,
+            prefilter_images=prefilter_images,
         )
+        self.single_pass = single_pass
 
     def split(self, file_path: str) -> List[Document]:
+        if self.single_pass:
+            return self._split_single_pass(file_path)
+
         pages = PageSplitPDFSplitter.split(self, file_path)
         if self.extract_images:
             docs = MultiModalPDFSplitter.split(self, file_path)
@@ -44,6 +56,23 @@ class MultiModalPageSplitPDFSplitter(PageSplitPDFSplitter, MultiModalPDFSplitter
         logger.info(f"Generated {len(chunks)} chunks.")
         return chunks
 
+    def _split_single_pass(self, file_path: str) -> List[Document]:
+        file_digest = compute_file_digest(file_path)
+
+        with fitz.open(file_path) as pdf:
+            pages = self.split_pages(
+                pdf=pdf, file_path=file_path, file_digest=file_digest
+            )
+            if self.extract_images:
+                image_docs = self.split_image_pages(pdf=pdf, file_digest=file_digest)
+            else:
+                image_docs = []
+
+        chunks = pages + image_docs
+
+        logger.info(f"Generated {len(chunks)} chunks.")
+        return chunks
+
 
 if __name__ == "__main__":
     pdf_doc = "data/test/documents/swda_factsheet.pdf"
@@ -54,6 +83,7 @@ if __name__ == "__main__":
         work_dir="data/test/splitters_cache",
         extract_images=True,
         filter_captions=True,
+        single_pass=True,
     )
 
     docs = mm_splitter.split(pdf_doc)
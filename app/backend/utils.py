@@ -1,11 +1,34 @@
-from typing import List, Tuple, Any
+from typing import Iterator, List, Tuple, Any
+import os
+import mmap
 import random
 import string
 import base64
 import hashlib
 import sqlite3
+import queue
+import threading
+from contextlib import contextmanager, closing
+import numpy as np
 import pandas as pd
 
+from app.backend.config import (
+    DIGEST_CACHE_PATH,
+    DIGEST_CACHE_MAX_ENTRIES,
+    DIGEST_CHUNK_SIZE,
+    SQLITE_POOL_SIZE,
+    SQLITE_MMAP_SIZE,
+)
+
+CREATE_DIGEST_TABLE = """
+CREATE TABLE IF NOT EXISTS file_digests (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    digest VARCHAR(64)
+);
+"""
+
 
 def get_rand_str(n: int) -> str:
     return "".join(random.choices(string.ascii_uppercase + string.digits, k=n))
@@ -17,27 +40,191 @@ def encode_image(image_path):
         return base64.b64encode(image_file.read()).decode("utf-8")
 
 
-def compute_file_digest(file_path: str) -> str:
+def compute_file_digest(file_path: str, use_cache: bool = True) -> str:
+    """
+    Computes the sha256 of the file by streaming it through a read-only memory map, so that memory
+    usage stays constant regardless of the file size. Digests are persisted in a small cache keyed
+    by (path, size, mtime) so that the same file is hashed at most once.
+    """
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+
+    if use_cache:
+        file_digest = _load_cached_digest(file_path, stat.st_size, stat.st_mtime_ns)
+        if file_digest is not None:
+            return file_digest
+
+    file_hash = hashlib.sha256()
+    if stat.st_size > 0:
+        with open(file_path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mm, memoryview(mm) as view:
+            for start in range(0, len(view), DIGEST_CHUNK_SIZE):
+                file_hash.update(view[start : start + DIGEST_CHUNK_SIZE])
+    file_digest = file_hash.hexdigest()
 
-    with open(file_path, "rb") as f:
-        file_digest = hashlib.sha256(f.read()).hexdigest()
+    if use_cache:
+        _save_cached_digest(file_path, stat.st_size, stat.st_mtime_ns, file_digest)
 
     return file_digest
 
 
+def _connect_digest_cache() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(DIGEST_CACHE_PATH), exist_ok=True)
+    conn = sqlite3.connect(DIGEST_CACHE_PATH, timeout=30)
+    try:
+        conn.execute(CREATE_DIGEST_TABLE)
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
+
+
+def _load_cached_digest(file_path: str, size: int, mtime_ns: int) -> str | None:
+    try:
+        with closing(_connect_digest_cache()) as conn:
+            row = conn.execute(
+                "SELECT digest FROM file_digests WHERE path = ? AND size = ? AND mtime_ns = ?;",
+                (file_path, size, mtime_ns),
+            ).fetchone()
+    except sqlite3.Error:
+        return None
+
+    return row[0] if row is not None else None
+
+
+def _save_cached_digest(file_path: str, size: int, mtime_ns: int, digest: str):
+    try:
+        with closing(_connect_digest_cache()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO file_digests(path, size, mtime_ns, digest) VALUES (?,?,?,?);",
+                (file_path, size, mtime_ns, digest),
+            )
+            # Keep only the most recent entries
+            conn.execute(
+                "DELETE FROM file_digests WHERE rowid NOT IN (SELECT rowid FROM file_digests ORDER BY rowid DESC LIMIT ?);",
+                (DIGEST_CACHE_MAX_ENTRIES,),
+            )
+    except sqlite3.Error:
+        pass
+
+
+def get_db_version(db_path: str) -> Tuple[int, int]:
+    stat = os.stat(db_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class SQLiteConnectionPool:
+    """
+    Thread-safe pool of read-only connections to a SQLite DB. Connections are memory mapped and kept
+    open, so queries don't pay the connection setup and the page cache warmup each time. The pool is
+    recycled when the DB file changes, since open connections keep reading a replaced file.
+    """
+
+    def __init__(self, db_path: str, max_connections: int = SQLITE_POOL_SIZE) -> None:
+        self.db_path = db_path
+        self.connections = queue.LifoQueue(maxsize=max_connections)
+        self.version = None
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        version = self._check_version()
+        try:
+            conn = self.connections.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+
+        reusable = False
+        try:
+            yield conn
+            reusable = True
+        finally:
+            # Connections are put back only after a successful query on the current DB version
+            if reusable and version == self.version:
+                try:
+                    self.connections.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+            else:
+                conn.close()
+
+    def _check_version(self) -> Tuple[int, int]:
+        version = get_db_version(self.db_path)
+        with self.lock:
+            if version != self.version:
+                if self.version is not None:
+                    self._close_all()
+                self.version = version
+        return version
+
+    def _close_all(self):
+        while True:
+            try:
+                self.connections.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"file:{os.path.abspath(self.db_path)}?mode=ro",
+            uri=True,
+            check_same_thread=False,
+        )
+        conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE};")
+        conn.execute("PRAGMA query_only = ON;")
+        return conn
+
+
+_connection_pools = {}
+_connection_pools_lock = threading.Lock()
+
+
+def get_connection_pool(db_path: str) -> SQLiteConnectionPool:
+    with _connection_pools_lock:
+        db_path = os.path.abspath(db_path)
+        if db_path not in _connection_pools:
+            _connection_pools[db_path] = SQLiteConnectionPool(db_path=db_path)
+        return _connection_pools[db_path]
+
+
 def query_db(
     db_path: str, query: str, return_df: bool = True
 ) -> Tuple[List[List[Any]], List[str]] | pd.DataFrame:
-    db_conn = sqlite3.connect(database=db_path)
-    cursor = db_conn.cursor()
-
-    res = cursor.execute(query)
-    rows = res.fetchall()
-    column_names = [col[0] for col in cursor.description]
-
-    db_conn.close()
+    with get_connection_pool(db_path).connection() as db_conn:
+        cursor = db_conn.execute(query)
+        rows = cursor.fetchall()
+        column_names = [col[0] for col in cursor.description]
 
     if return_df:
-        return pd.DataFrame(data=rows, columns=column_names)
+        return rows_to_df(rows, column_names)
     else:
         return rows, column_names
+
+
+def rows_to_df(rows: List[Tuple], column_names: List[str]) -> pd.DataFrame:
+    """
+    Builds the DataFrame from one typed array per column, instead of going through a 2D object
+    array of the rows that is converted column by column afterwards. The dtypes are the ones
+    pandas infers from the rows.
+    """
+    columns = list(zip(*rows)) if len(rows) > 0 else [()] * len(column_names)
+
+    df = pd.DataFrame({i: _column_to_array(column) for i, column in enumerate(columns)})
+    # Columns are set afterwards since a query can return duplicated names
+    df.columns = column_names
+    return df
+
+
+def _column_to_array(values: Tuple) -> np.ndarray:
+    # SQLite values are int, float, str, bytes or None, only the numeric ones get a typed array
+    types = set(map(type, values))
+    if types == {int}:
+        return np.fromiter(values, dtype=np.int64, count=len(values))
+    if types and types <= {int, float, type(None)} and types != {type(None)}:
+        return np.fromiter(
+            (np.nan if v is None else v for v in values),
+            dtype=np.float64,
+            count=len(values),
+        )
+    return np.array(values, dtype=object)
@@ -1,7 +1,7 @@
 import streamlit as st
 from dotenv import load_dotenv
 
-from app.web.utils import load_etf_db
+from app.web.utils import load_etf_db, warmup_resources
 from app.web.ui import make_searchbar
 
 st.set_page_config(layout="centered")
@@ -9,6 +9,7 @@ st.set_page_config(layout="centered")
 load_dotenv(override=True)
 with st.spinner():
     etf_df = load_etf_db()
+    warmup_resources()
 
 
 # Init session
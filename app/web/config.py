@@ -6,14 +6,49 @@ DOC_DB = "data/sqlite/doc.sqlite3"
 ETF_DB = "data/sqlite/etf.sqlite3"
 DISPLAY_TABLE = "etf_search_data"
 
+# Create the chats shared resources (langchain, chromadb, values catalog) in the background at
+# startup. Off by default, since it loads heavy packages and can call the embeddings API.
+WARMUP_SHARED_RESOURCES = False
+
+# Columns of the ETF table held as categoricals and as booleans (if they have no missing values)
+ETF_CATEGORICAL_COLUMNS = [
+    "region",
+    "currency",
+    "asset",
+    "instrument",
+    "dividends",
+    "replication",
+    "strategy",
+    "domicile_country",
+]
+EXCHANGE_COLUMNS = [
+    "Borsa Italiana",
+    "London",
+    "Stuttgart",
+    "gettex",
+    "Euronext Amsterdam",
+    "Euronext Paris",
+    "XETRA",
+    "SIX Swiss Exchange",
+    "Euronext Brussels",
+]
+ETF_BOOL_COLUMNS = ["hedged", "is_sustainable", "securities_lending"] + EXCHANGE_COLUMNS
+
 
 RETRIEVER_VECTORSTORE_PATH = "data/retriever/chromadb"
 RETRIEVER_DOCSTORE_PATH = "data/retriever/file_stores"
 RETRIEVER_VECTORSTORE_COLLECTION = "doc_qa_v1.1"
 
+BUCKET_BACKEND = "minio"  # "minio" or "local" for the filesystem stand-in
 BUCKET_URL = "localhost:9000"
+BUCKET_LOCAL_PATH = "data/bucket"
 BUCKET_NAME = "etfdocs"
+BLOB_CACHE_PATH = "data/cache/blobs"
+BLOB_CACHE_MAX_SIZE = 2 * 1024 * 1024 * 1024  # bytes of documents kept on disk
+DOCS_CACHE_MAX_SIZE = 256 * 1024 * 1024  # bytes of documents kept in memory
+DOCS_PREFETCH_WORKERS = 4  # concurrent fetches of the documents of an ETF
 
 SPLITTERS_CACHE = "data/splitters_cache"
+SPLITTERS_WORKERS = 4
 
 DOC_VIEW_MAX_SIZE = "1048576"
@@ -86,13 +86,13 @@ if question:
     messages_container.chat_message(name="user").write(question)
 
     chat: ETFSearchChat = st.session_state.search_chat
-    answer, etfs_filtered_df = chat.chat(question=question)
+    tokens, etfs_filtered_df = chat.stream(question=question)
+    answer = messages_container.chat_message(name="ai").write_stream(tokens)
 
     st.session_state.search_chat_history.append(("ai", answer))
     if etfs_filtered_df is not None and len(etfs_filtered_df):
         st.session_state.tables_history[question] = etfs_filtered_df
 
-    messages_container.chat_message(name="ai").write(answer)
     st.rerun()
 
 if reset_button:
@@ -80,9 +80,14 @@ with documents_tab:
 
     with rdocs:
         if docs:
+            # Warm the cache with all the documents of the ETF before the first view
+            etf_doc_storage.prefetch_documents(docs)
             for doc in docs:
                 display_doc_panel(
-                    doc=doc, collapsed=st.session_state.active_doc is not None
+                    doc=doc,
+                    get_doc_data=etf_doc_storage.get_document_bytes,
+                    get_cached_doc_data=etf_doc_storage.get_cached_document_bytes,
+                    collapsed=st.session_state.active_doc is not None,
                 )
         else:
             st.write("No documents were found for this ETF!")
@@ -131,17 +136,34 @@ if st.session_state.active_doc and question:
     st.session_state.conversations[active_doc_id].append(("user", question))
     messages_container.chat_message(name="user").write(question)
 
-    answer, sources = st.session_state.chats[active_doc_id].chat(question=question)
+    sources = {}
+
+    def stream_answer():
+        for kind, value in st.session_state.chats[active_doc_id].stream(
+            question=question
+        ):
+            if kind == "token":
+                yield value
+            else:
+                sources.update(value)
+
+    with messages_container.chat_message(name="ai"):
+        answer = st.write_stream(stream_answer)
+        # The sources are known only once the answer has been fully streamed
+        source_pages = sorted(
+            {page for pages in sources.values() for page in pages if page is not None}
+        )
+        if source_pages:
+            st.caption("Sources: pages " + ", ".join(str(p) for p in source_pages))
 
     st.session_state.conversations[active_doc_id].append(("ai", answer))
-    messages_container.chat_message(name="ai").write(answer)
 
 if reset_button:
     active_doc_id = st.session_state.active_doc
 
     for doc in docs:
-        if doc[0].id == active_doc_id:
-            active_doc_metadata = doc[0]
+        if doc.id == active_doc_id:
+            active_doc_metadata = doc
             break
     st.session_state.chats[active_doc_id] = create_docqa_chat(
         doc_metadata=active_doc_metadata
@@ -101,7 +101,10 @@ with manage_tab:
                     )
 
             if st.button("Delete", use_container_width=True):
-                docs_db.delete_doc(doc_id=selected_doc.id)
+                docs_storage.delete_doc(
+                    doc_id=selected_doc.id,
+                    source_id=selected_doc.vectorstore_source_id,
+                )
                 st.rerun()
 
 
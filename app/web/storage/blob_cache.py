@@ -0,0 +1,187 @@
+from typing import Callable
+import os
+import time
+import fcntl
+import hashlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from loguru import logger
+
+CREATE_BLOBS_TABLE = """
+CREATE TABLE IF NOT EXISTS blobs (
+    object_key VARCHAR(256) PRIMARY KEY,
+    digest VARCHAR(64),
+    size INTEGER,
+    last_access REAL
+);
+"""
+
+N_LOCK_STRIPES = 256
+
+
+class DiskBlobCache:
+    """
+    Disk-backed read-through cache of immutable bucket objects, shared by all the processes of a node.
+    Blobs are stored by the sha256 of their content and written atomically, an SQLite index maps the
+    object keys to the blobs and tracks their last access for the LRU eviction beyond the size limit.
+    Misses of the same object are fetched only once across processes, thanks to file locks.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int) -> None:
+        self.max_size = max_size
+        self.blobs_dir = os.path.join(cache_dir, "blobs")
+        self.locks_dir = os.path.join(cache_dir, "locks")
+        os.makedirs(self.blobs_dir, exist_ok=True)
+        os.makedirs(self.locks_dir, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(
+            os.path.join(cache_dir, "index.sqlite3"),
+            timeout=30,
+            check_same_thread=False,
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL;")
+        self.conn.execute(CREATE_BLOBS_TABLE)
+        self.lock = threading.Lock()
+
+    def get_or_fetch(self, object_key: str, fetch: Callable[[], bytes]) -> bytes:
+        data = self.get(object_key)
+        if data is not None:
+            return data
+
+        with self._object_lock(object_key):
+            # Another process may have fetched the object while waiting for the lock
+            data = self.get(object_key, count_miss=False)
+            if data is not None:
+                return data
+
+            data = fetch()
+            self.put(object_key, data)
+            return data
+
+    def get(self, object_key: str, count_miss: bool = True) -> bytes | None:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT digest FROM blobs WHERE object_key = ?;", (object_key,)
+            ).fetchone()
+
+        data = None
+        if row is not None:
+            try:
+                with open(self._blob_path(row[0]), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                logger.warning(f"Blob of {object_key} is missing from the cache.")
+
+        with self.lock:
+            if data is not None:
+                self.hits += 1
+                with self.conn:
+                    self.conn.execute(
+                        "UPDATE blobs SET last_access = ? WHERE object_key = ?;",
+                        (time.time(), object_key),
+                    )
+            elif count_miss:
+                self.misses += 1
+
+        return data
+
+    def put(self, object_key: str, data: bytes):
+        if len(data) > self.max_size:
+            return
+
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(digest)
+
+        # Identical contents are stored only once
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            tmp_path = f"{blob_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, blob_path)
+
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO blobs(object_key, digest, size, last_access) VALUES (?,?,?,?);",
+                (object_key, digest, len(data), time.time()),
+            )
+            self._evict()
+
+    def delete(self, object_key: str):
+        with self.lock, self.conn:
+            row = self.conn.execute(
+                "SELECT digest FROM blobs WHERE object_key = ?;", (object_key,)
+            ).fetchone()
+            if row is None:
+                return
+            self.conn.execute("DELETE FROM blobs WHERE object_key = ?;", (object_key,))
+            self._remove_unreferenced([row[0]])
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    @contextmanager
+    def _object_lock(self, object_key: str):
+        # Lock striping keeps the number of lock files bounded
+        stripe = int(hashlib.sha256(object_key.encode("utf-8")).hexdigest(), 16)
+        lock_path = os.path.join(self.locks_dir, f"{stripe % N_LOCK_STRIPES}.lock")
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _evict(self):
+        # Blobs shared by several objects are counted once per object, which only makes eviction earlier
+        total_size = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM blobs;"
+        ).fetchone()[0]
+        if total_size <= self.max_size:
+            return
+
+        rows = self.conn.execute(
+            "SELECT object_key, digest, size FROM blobs ORDER BY last_access ASC;"
+        ).fetchall()
+        evicted = []
+        for object_key, digest, size in rows:
+            if total_size <= self.max_size:
+                break
+            evicted.append((object_key, digest))
+            total_size -= size
+
+        self.conn.executemany(
+            "DELETE FROM blobs WHERE object_key = ?;", [(key,) for key, _ in evicted]
+        )
+        self._remove_unreferenced([digest for _, digest in evicted])
+        logger.info(f"Evicted {len(evicted)} objects from the blob cache.")
+
+    def _remove_unreferenced(self, digests):
+        for digest in set(digests):
+            n_refs = self.conn.execute(
+                "SELECT COUNT(*) FROM blobs WHERE digest = ?;", (digest,)
+            ).fetchone()[0]
+            if n_refs > 0:
+                continue
+            try:
+                os.remove(self._blob_path(digest))
+            except FileNotFoundError:
+                pass
+
+
+if __name__ == "__main__":
+    cache = DiskBlobCache(cache_dir="tmp/blob_cache", max_size=1024 * 1024)
+
+    cache.get_or_fetch("etf-docs-test/doc", lambda: b"%PDF-1.4 test document")
+    cache.get_or_fetch("etf-docs-test/doc", lambda: b"%PDF-1.4 test document")
+
+    print(f"Hits: {cache.hits}, misses: {cache.misses}")
@@ -1,8 +1,12 @@
 import os
+import shutil
 from minio import Minio
 from io import BytesIO
 
 from app.web.utils import get_rand_str
+from app.web.storage.blob_cache import DiskBlobCache
+
+STREAM_CHUNK_SIZE = 1024 * 1024
 
 
 class BucketStorage:
@@ -33,10 +37,82 @@ class BucketStorage:
 
         return output_file
 
+    def get_bytes(self, bucket: str, filename: str) -> bytes:
+        """Streams the object straight into memory, without temporary files."""
+        response = self.client.get_object(bucket_name=bucket, object_name=filename)
+        try:
+            return b"".join(response.stream(amt=STREAM_CHUNK_SIZE))
+        finally:
+            response.close()
+            response.release_conn()
+
     def delete_file(self, bucket: str, filename: str) -> str:
         self.client.remove_object(bucket_name=bucket, object_name=filename)
 
 
+class LocalBucketStorage:
+    """Filesystem stand-in of the bucket storage, with the same interface, for local runs."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def add_file(self, bucket, data: BytesIO) -> str:
+        object_name = get_rand_str(n=12)
+        object_path = os.path.join(self.root, bucket, object_name)
+
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        tmp_path = object_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data.getvalue())
+        os.replace(tmp_path, object_path)
+
+        return object_name
+
+    def get_file(self, bucket: str, filename: str, save_folder: str) -> str:
+        output_file = os.path.join(save_folder, filename + ".pdf")
+        shutil.copyfile(os.path.join(self.root, bucket, filename), output_file)
+        return output_file
+
+    def get_bytes(self, bucket: str, filename: str) -> bytes:
+        with open(os.path.join(self.root, bucket, filename), "rb") as f:
+            return f.read()
+
+    def delete_file(self, bucket: str, filename: str) -> str:
+        os.remove(os.path.join(self.root, bucket, filename))
+
+
+class CachedBucketStorage:
+    """
+    Read-through cache in front of a bucket storage. Objects are immutable once added, so they are
+    read from the bucket only once per node and then served from the local disk.
+    """
+
+    def __init__(
+        self, storage: BucketStorage | LocalBucketStorage, cache: DiskBlobCache
+    ) -> None:
+        self.storage = storage
+        self.cache = cache
+
+    def add_file(self, bucket, data: BytesIO) -> str:
+        return self.storage.add_file(bucket=bucket, data=data)
+
+    def get_file(self, bucket: str, filename: str, save_folder: str) -> str:
+        output_file = os.path.join(save_folder, filename + ".pdf")
+        with open(output_file, "wb") as f:
+            f.write(self.get_bytes(bucket=bucket, filename=filename))
+        return output_file
+
+    def get_bytes(self, bucket: str, filename: str) -> bytes:
+        return self.cache.get_or_fetch(
+            f"{bucket}/{filename}",
+            lambda: self.storage.get_bytes(bucket=bucket, filename=filename),
+        )
+
+    def delete_file(self, bucket: str, filename: str) -> str:
+        self.storage.delete_file(bucket=bucket, filename=filename)
+        self.cache.delete(f"{bucket}/{filename}")
+
+
 if __name__ == "__main__":
     from dotenv import load_dotenv
 
@@ -0,0 +1,77 @@
+from typing import Callable, Dict
+from collections import OrderedDict
+from concurrent.futures import Future
+import threading
+from loguru import logger
+
+
+class LRUBytesCache:
+    """
+    In-memory LRU cache of objects bytes bounded by their total size and shared by all sessions.
+    Concurrent requests of the same missing object wait for a single fetch.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self.size = 0
+        self.objects: OrderedDict[str, bytes] = OrderedDict()
+        self.pending: Dict[str, Future] = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self.lock:
+            data = self.objects.get(key)
+            if data is not None:
+                self.objects.move_to_end(key)
+            return data
+
+    def get_or_fetch(self, key: str, fetch: Callable[[], bytes]) -> bytes:
+        with self.lock:
+            data = self.objects.get(key)
+            if data is not None:
+                self.objects.move_to_end(key)
+                return data
+
+            pending = self.pending.get(key)
+            is_owner = pending is None
+            if is_owner:
+                pending = Future()
+                self.pending[key] = pending
+
+        if not is_owner:
+            return pending.result()
+
+        try:
+            data = fetch()
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        else:
+            self.put(key, data)
+            pending.set_result(data)
+            return data
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+
+    def put(self, key: str, data: bytes):
+        with self.lock:
+            if key in self.objects:
+                self.size -= len(self.objects.pop(key))
+
+            # Objects larger than the whole cache are never cached
+            if len(data) > self.max_size:
+                return
+
+            self.objects[key] = data
+            self.size += len(data)
+
+            while self.size > self.max_size:
+                evicted_key, evicted = self.objects.popitem(last=False)
+                self.size -= len(evicted)
+                logger.debug(f"Evicted {evicted_key} from the cache.")
+
+    def delete(self, key: str):
+        with self.lock:
+            if key in self.objects:
+                self.size -= len(self.objects.pop(key))
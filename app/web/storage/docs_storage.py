@@ -1,45 +1,85 @@
-from typing import List, Tuple
+from typing import List
 import os
+from concurrent.futures import Future, ThreadPoolExecutor
 from io import BytesIO
-import shutil
 from loguru import logger
 from dotenv import load_dotenv
 
 from app.web.utils import get_rand_str
 from app.web.config import (
     DOC_DB,
+    BUCKET_BACKEND,
     BUCKET_URL,
+    BUCKET_LOCAL_PATH,
     BUCKET_NAME,
+    BLOB_CACHE_PATH,
+    BLOB_CACHE_MAX_SIZE,
+    DOCS_CACHE_MAX_SIZE,
+    DOCS_PREFETCH_WORKERS,
     SPLITTERS_CACHE,
+    SPLITTERS_WORKERS,
     RETRIEVER_DOCSTORE_PATH,
     RETRIEVER_VECTORSTORE_COLLECTION,
     RETRIEVER_VECTORSTORE_PATH,
 )
 from app.web.storage.docs_db import ETFDocumentsDatabase, DocMetadata
-from app.web.storage.bucket import BucketStorage
+from app.web.storage.bucket import (
+    BucketStorage,
+    LocalBucketStorage,
+    CachedBucketStorage,
+)
+from app.web.storage.blob_cache import DiskBlobCache
+from app.web.storage.bytes_cache import LRUBytesCache
 
 
 from app.backend.retrievers import MultiModalChromaRetriever
-from app.backend.splitters import MultiModalPDFSplitter, MultiModalPageSplitPDFSplitter
+from app.backend.chats.answer_cache import DocQAAnswerCache
+from app.backend.registry import registry
 
 
 TMP_WORKING_FOLDER = "work_dir"
 
 
+def _create_bucket_storage() -> CachedBucketStorage:
+    if BUCKET_BACKEND == "local":
+        storage = LocalBucketStorage(root=BUCKET_LOCAL_PATH)
+    else:
+        storage = BucketStorage(
+            url=BUCKET_URL,
+            key=os.environ.get("BUCKET_KEY"),
+            secret=os.environ.get("BUCKET_SECRET"),
+        )
+
+    cache = DiskBlobCache(cache_dir=BLOB_CACHE_PATH, max_size=BLOB_CACHE_MAX_SIZE)
+    return CachedBucketStorage(storage=storage, cache=cache)
+
+
 # Wrapper for adding, retrieving and/or updating etf docs
 class ETFDocStorage:
     def __init__(self) -> None:
         load_dotenv(override=True)
         self.docs_db = ETFDocumentsDatabase(db_path=DOC_DB)
-        self.docs_bucket = BucketStorage(
-            url=BUCKET_URL,
-            key=os.environ.get("BUCKET_KEY"),
-            secret=os.environ.get("BUCKET_SECRET"),
+        # The DB connection can't be shared between threads, the other components are shared by all sessions
+        self.docs_bucket: CachedBucketStorage = registry.get_or_create(
+            "bucket_storage", _create_bucket_storage
+        )
+        self.retriever: MultiModalChromaRetriever = registry.get_or_create(
+            "docs_storage_retriever",
+            lambda: MultiModalChromaRetriever(
+                chroma_store=RETRIEVER_VECTORSTORE_PATH,
+                local_store=RETRIEVER_DOCSTORE_PATH,
+                collection=RETRIEVER_VECTORSTORE_COLLECTION,
+            ),
+        )
+        self.answer_cache: DocQAAnswerCache = registry.get("docqa_answer_cache")
+        self.docs_cache: LRUBytesCache = registry.get_or_create(
+            "docs_bytes_cache", lambda: LRUBytesCache(max_size=DOCS_CACHE_MAX_SIZE)
         )
-        self.retriever = MultiModalChromaRetriever(
-            chroma_store=RETRIEVER_VECTORSTORE_PATH,
-            local_store=RETRIEVER_DOCSTORE_PATH,
-            collection=RETRIEVER_VECTORSTORE_COLLECTION,
+        self.prefetch_executor: ThreadPoolExecutor = registry.get_or_create(
+            "docs_prefetch_executor",
+            lambda: ThreadPoolExecutor(
+                max_workers=DOCS_PREFETCH_WORKERS, thread_name_prefix="docs-prefetch"
+            ),
         )
 
     # Add to bucket, # add to vector store, # add to db
@@ -64,12 +104,19 @@ class ETFDocStorage:
             logger.opt(exception=e).error("Failed to add file to bucket.")
             return doc_id
 
+        # Splitters are only needed when uploading documents, they load the layout models dependencies
+        from app.backend.splitters import (
+            MultiModalPDFSplitter,
+            MultiModalPageSplitPDFSplitter,
+        )
+
         try:
             if split_by == "bypage":
                 splitter = MultiModalPageSplitPDFSplitter(
                     work_dir=SPLITTERS_CACHE,
                     extract_images=multimodal,
                     filter_captions=multimodal,
+                    single_pass=True,
                 )
 
             elif split_by == "bylayout":
@@ -79,6 +126,7 @@ class ETFDocStorage:
                     min_chunk_size=0,
                     extract_images=multimodal,
                     filter_captions=multimodal,
+                    n_workers=SPLITTERS_WORKERS,
                 )
             else:
                 raise NotImplementedError
@@ -91,6 +139,9 @@ class ETFDocStorage:
                 file_path=tmp_file, splitter=splitter
             )
             os.remove(tmp_file)
+
+            # Answers cached for a previous version of the document are stale
+            self.answer_cache.invalidate(source_id=vectordb_source_id)
         except Exception as e:
             logger.opt(exception=e).error("Failed to add document to the vectorstore")
             self.docs_bucket.delete_file(bucket=bucket, filename=bucket_file)
@@ -122,35 +173,49 @@ class ETFDocStorage:
     def get_documents(
         self,
         etf_isin: str,
-    ) -> List[Tuple[DocMetadata, bytes]]:
-
-        docs_metadata: List[DocMetadata] = self.docs_db.get_docs_by_etf(
-            etf_isin=etf_isin
+    ) -> List[DocMetadata]:
+        """Returns only the metadata of the documents, their bytes are fetched on demand."""
+        return self.docs_db.get_docs_by_etf(etf_isin=etf_isin)
+
+    def get_document_bytes(self, doc_metadata: DocMetadata) -> bytes:
+        """Fetches the bytes of the document, concurrent fetches of the same document are shared."""
+        bucket, filename = doc_metadata.bucket_filename.split("/")
+        return self.docs_cache.get_or_fetch(
+            doc_metadata.bucket_filename,
+            lambda: self.docs_bucket.get_bytes(bucket=bucket, filename=filename),
         )
 
-        if len(docs_metadata) == 0:
-            return []
-
-        os.makedirs(TMP_WORKING_FOLDER, exist_ok=True)
-        docs = []
-        for doc_metadata in docs_metadata:
-            bucket, filename = doc_metadata.bucket_filename.split("/")
-            doc_tmp_path = self.docs_bucket.get_file(
-                bucket=bucket,
-                filename=filename,
-                save_folder=TMP_WORKING_FOLDER,
+    def prefetch_documents(self, docs: List[DocMetadata]):
+        """
+        Fetches the bytes of the documents concurrently in the background, so that they are already
+        in memory when viewed. A view requested meanwhile waits for the same fetch.
+        """
+        for doc_metadata in docs:
+            if self.get_cached_document_bytes(doc_metadata) is not None:
+                continue
+
+            future = self.prefetch_executor.submit(
+                self.get_document_bytes, doc_metadata
             )
-            with open(doc_tmp_path, "rb") as f:
-                doc_bytes = f.read()
+            future.add_done_callback(self._log_prefetch_error)
 
-            docs.append((doc_metadata, doc_bytes))
+    @staticmethod
+    def _log_prefetch_error(future: Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.opt(exception=future.exception()).warning(
+                "Failed to prefetch document."
+            )
 
-        shutil.rmtree(TMP_WORKING_FOLDER)
-        return docs
+    def get_cached_document_bytes(self, doc_metadata: DocMetadata) -> bytes | None:
+        """Returns the bytes of the document only if they are already in memory."""
+        return self.docs_cache.get(doc_metadata.bucket_filename)
 
-    def delete_doc(self, doc_id: int):
+    def delete_doc(self, doc_id: int, source_id: str | None = None):
         res = self.docs_db.delete_doc(doc_id=doc_id)
 
+        if source_id is not None:
+            self.answer_cache.invalidate(source_id=source_id)
+
         if not res:
             return False
 
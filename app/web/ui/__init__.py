@@ -1,5 +1,18 @@
-from .etfs_table import display_table
-from .searchbar import make_searchbar
-from .chart import display_chart
-from .etf_overview import display_overview_table
-from .documents import display_doc_panel, display_doc_view
+# Components are imported at first use, so that each page only loads the dependencies (charts,
+# PDF rendering, chats...) of the components it displays
+_LAZY_IMPORTS = {
+    "display_table": ".etfs_table",
+    "make_searchbar": ".searchbar",
+    "display_chart": ".chart",
+    "display_overview_table": ".etf_overview",
+    "display_doc_panel": ".documents",
+    "display_doc_view": ".documents",
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_IMPORTS:
+        import importlib
+
+        return getattr(importlib.import_module(_LAZY_IMPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
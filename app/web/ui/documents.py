@@ -1,6 +1,6 @@
 import streamlit as st
 import base64
-from typing import Tuple, List
+from typing import Callable, List
 from fitz import Document
 import math
 
@@ -18,8 +18,14 @@ def display_doc_view(ref: st, doc_view_data):
     ref.markdown(pdf_display, unsafe_allow_html=True)
 
 
-def display_doc_panel(doc: Tuple[DocMetadata, bytes], collapsed: bool = False):
-    metadata, doc_data = doc
+def display_doc_panel(
+    doc: DocMetadata,
+    get_doc_data: Callable[[DocMetadata], bytes],
+    get_cached_doc_data: Callable[[DocMetadata], bytes | None],
+    collapsed: bool = False,
+):
+    """The document bytes are only fetched when the document is opened or downloaded."""
+    metadata = doc
     doc_id = metadata.id
 
     cont = st.container(
@@ -43,13 +49,22 @@ def display_doc_panel(doc: Tuple[DocMetadata, bytes], collapsed: bool = False):
             type="primary",
         )
 
-        cdownload.download_button(
-            "Download",
+        doc_data = get_cached_doc_data(metadata)
+        if doc_data is not None:
+            cdownload.download_button(
+                "Download",
+                use_container_width=True,
+                key="download_doc" + str(doc_id),
+                file_name=f"{metadata.name}.pdf",
+                data=doc_data,
+            )
+        elif cdownload.button(
+            "Prepare download",
             use_container_width=True,
-            key="download_doc" + str(doc_id),
-            file_name=f"{metadata.name}.pdf",
-            data=doc_data,
-        )
+            key="prepare_download_doc" + str(doc_id),
+        ):
+            get_doc_data(metadata)
+            st.rerun()
 
         if chat_button:
             # Close current document
@@ -59,7 +74,7 @@ def display_doc_panel(doc: Tuple[DocMetadata, bytes], collapsed: bool = False):
             else:
                 st.session_state.active_doc = doc_id
                 st.session_state.doc_view_data = split_document(
-                    doc_data=doc_data, max_size=int(DOC_VIEW_MAX_SIZE)
+                    doc_data=get_doc_data(metadata), max_size=int(DOC_VIEW_MAX_SIZE)
                 )
 
                 if doc_id not in st.session_state.conversations:
@@ -1,20 +1,9 @@
 import streamlit as st
 import pandas as pd
-from app.web.config import UI_ROOT_URL, ANALYTICS_PAGE_PATH
+from app.web.config import UI_ROOT_URL, ANALYTICS_PAGE_PATH, EXCHANGE_COLUMNS
 
 DETILS_PAGE_URL = UI_ROOT_URL + ANALYTICS_PAGE_PATH
 
-EXCHANGE_COLUMNS = [
-    "Borsa Italiana",
-    "London",
-    "Stuttgart",
-    "gettex",
-    "Euronext Amsterdam",
-    "Euronext Paris",
-    "XETRA",
-    "SIX Swiss Exchange",
-    "Euronext Brussels",
-]
 COLUMNS_DISPLAY_NAME = {
     "ticker": "Ticker",
     "currency": "Currency",
@@ -29,7 +18,7 @@ COLUMNS_DISPLAY_NAME = {
 def display_table(ref, etf_df: pd.DataFrame, height=None):
 
     if len(etf_df) and DETILS_PAGE_URL not in etf_df["isin"].values[0]:
-        link_isin_to_page(etf_df=etf_df)
+        etf_df = link_isin_to_page(etf_df=etf_df)
 
     table_config = {
         "isin": st.column_config.LinkColumn(
@@ -92,8 +81,9 @@ def display_table(ref, etf_df: pd.DataFrame, height=None):
     )
 
 
-def link_isin_to_page(etf_df: pd.DataFrame) -> None:
+def link_isin_to_page(etf_df: pd.DataFrame) -> pd.DataFrame:
     """Make etf isin clickable with a link to the corresponding page describing the ETF"""
     link_template = DETILS_PAGE_URL + "/?isin={isin}"
     isin_urls = [link_template.format(isin=t) for t in etf_df["isin"]]
-    etf_df["isin"] = isin_urls
+    # The given df can be the snapshot shared by all sessions, it must not be modified
+    return etf_df.assign(isin=isin_urls)
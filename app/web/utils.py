@@ -1,5 +1,7 @@
-from typing import Tuple, List
+from typing import Tuple, List, TYPE_CHECKING
+import os
 import sqlite3
+import threading
 import pandas as pd
 import random
 import string
@@ -10,12 +12,20 @@ from app.web.storage.docs_db import DocMetadata
 from app.web.config import (
     ETF_DB,
     DISPLAY_TABLE,
+    ETF_CATEGORICAL_COLUMNS,
+    ETF_BOOL_COLUMNS,
     RETRIEVER_DOCSTORE_PATH,
     RETRIEVER_VECTORSTORE_COLLECTION,
     RETRIEVER_VECTORSTORE_PATH,
+    WARMUP_SHARED_RESOURCES,
 )
-from app.backend.retrievers import MultiModalChromaRetriever
-from app.backend.chats.docqa import DocumentsQAChat
+from app.backend.utils import query_db
+from app.backend.registry import registry
+
+# The chats and the retrievers are imported at first use, the pages only showing ETF data don't
+# need to load langchain and chromadb
+if TYPE_CHECKING:
+    from app.backend.chats.docqa import DocumentsQAChat
 
 
 @dataclass
@@ -29,28 +39,113 @@ def get_rand_str(n: int) -> str:
     return "".join(random.choices(string.ascii_uppercase + string.digits, k=n))
 
 
+class _ETFTableSnapshot:
+    """
+    Snapshot of the ETF table shared by all the sessions of the process, reloaded only when the DB
+    file is modified or the DB data version changes.
+    """
+
+    def __init__(self) -> None:
+        self.df = None
+        self.version = None
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def get(self) -> pd.DataFrame:
+        with self.lock:
+            version = self._get_db_version()
+            if self.df is None or version != self.version:
+                logger.info("Loading ETF table snapshot...")
+                self.df = self._load()
+                self.version = version
+            return self.df
+
+    def _get_db_version(self) -> Tuple[int, int, int]:
+        # The data version changes whenever another connection commits to the DB
+        if self.conn is None:
+            self.conn = sqlite3.connect(
+                f"file:{os.path.abspath(ETF_DB)}?mode=ro",
+                uri=True,
+                check_same_thread=False,
+            )
+        data_version = self.conn.execute("PRAGMA data_version;").fetchone()[0]
+        stat = os.stat(ETF_DB)
+        return stat.st_mtime_ns, stat.st_size, data_version
+
+    @staticmethod
+    def _load() -> pd.DataFrame:
+        etf_data_df = query_db(db_path=ETF_DB, query=f"select * from {DISPLAY_TABLE}")
+
+        for c in ETF_CATEGORICAL_COLUMNS:
+            if c in etf_data_df.columns:
+                etf_data_df[c] = etf_data_df[c].astype("category")
+
+        for c in ETF_BOOL_COLUMNS:
+            if (
+                c in etf_data_df.columns
+                and etf_data_df[c].notna().all()
+                and etf_data_df[c].isin([0, 1]).all()
+            ):
+                etf_data_df[c] = etf_data_df[c].astype(bool)
+
+        return etf_data_df
+
+
+_etf_table_snapshot = _ETFTableSnapshot()
+
+
 def load_etf_db() -> pd.DataFrame:
-    conn = sqlite3.Connection(ETF_DB)
-    etf_data_df = pd.read_sql(f"select * from {DISPLAY_TABLE}", con=conn)
+    """Returns the ETF table snapshot shared by all sessions, it must not be modified in place."""
+    return _etf_table_snapshot.get()
 
-    return etf_data_df
 
+def create_docqa_chat(doc_metadata: DocMetadata) -> "DocumentsQAChat":
+    from app.backend.retrievers import MultiModalChromaRetriever
+    from app.backend.chats.docqa import DocumentsQAChat
 
-def create_docqa_chat(doc_metadata: DocMetadata) -> DocumentsQAChat:
-    retriever = MultiModalChromaRetriever(
-        chroma_store=RETRIEVER_VECTORSTORE_PATH,
-        local_store=RETRIEVER_DOCSTORE_PATH,
-        collection=RETRIEVER_VECTORSTORE_COLLECTION,
-        top_k=doc_metadata.top_k,
-        source_id=doc_metadata.vectorstore_source_id,
+    # Retrievers hold no conversation state, they are shared by all the chats on the same document
+    retriever = registry.get_or_create(
+        ("docqa_retriever", doc_metadata.vectorstore_source_id, doc_metadata.top_k),
+        lambda: MultiModalChromaRetriever(
+            chroma_store=RETRIEVER_VECTORSTORE_PATH,
+            local_store=RETRIEVER_DOCSTORE_PATH,
+            collection=RETRIEVER_VECTORSTORE_COLLECTION,
+            top_k=doc_metadata.top_k,
+            source_id=doc_metadata.vectorstore_source_id,
+        ),
     )
     chat = DocumentsQAChat(
         retriever=retriever.get_retriever(),
         combine_docs_func=retriever.combine_docs,
         filter_irrelevant_sources=doc_metadata.filter_sources,
+        source_id=doc_metadata.vectorstore_source_id,
+        answer_cache=registry.get("docqa_answer_cache"),
     )
     logger.info(
         f"Initialized new chat on document {retriever.source_id} uising the {retriever.top_k} most relevant chunks."
     )
 
     return chat
+
+
+_warmup_started = threading.Event()
+
+
+def warmup_resources():
+    """
+    Creates the shared resources in a background thread, so that the first chat does not wait for
+    them while the page is rendered immediately. Only the first call of the process has effect and
+    only if WARMUP_SHARED_RESOURCES is enabled, otherwise resources are created at first use.
+    """
+    if not WARMUP_SHARED_RESOURCES or _warmup_started.is_set():
+        return
+    _warmup_started.set()
+
+    def warmup():
+        try:
+            registry.warmup(["embeddings", "table_summarize_chain", "values_catalog"])
+            logger.info(f"Shared resources health: {registry.health()}")
+        except Exception as e:
+            logger.opt(exception=e).error("Failed to warm up the shared resources.")
+
+    threading.Thread(target=warmup, daemon=True).start()
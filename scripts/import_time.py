@@ -0,0 +1,91 @@
+"""
+Measures the import time of the modules imported by each Streamlit page, i.e. the cold start cost paid
+on every worker restart before the page can be rendered.
+
+Usage: python scripts/import_time.py [--top N]
+"""
+
+from typing import Dict, List, Tuple
+import os
+import re
+import ast
+import sys
+import argparse
+import subprocess
+from glob import glob
+
+WEB_DIR = os.path.join("app", "web")
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def find_pages() -> List[str]:
+    return [os.path.join(WEB_DIR, "Home.py")] + sorted(
+        glob(os.path.join(WEB_DIR, "pages", "*.py"))
+    )
+
+
+def get_page_imports(page: str) -> List[str]:
+    """Import statements at the top level of the page, the ones executed at page load."""
+    with open(page, "r") as f:
+        tree = ast.parse(f.read())
+
+    return [
+        ast.unparse(node)
+        for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    ]
+
+
+def run_importtime(code: str) -> Dict[str, float]:
+    """Cumulative import time (s) of each top level module imported while running the code."""
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": os.getcwd()},
+    )
+    if res.returncode != 0:
+        raise RuntimeError(res.stderr.strip().splitlines()[-1])
+
+    modules: Dict[str, float] = {}
+    for line in res.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        # Only modules imported directly by the code (no indentation)
+        if match is not None and len(match.group(3)) == 1:
+            modules[match.group(4)] = int(match.group(2)) / 1e6
+
+    return modules
+
+
+def measure_imports(
+    imports: List[str], baseline: Dict[str, float]
+) -> Tuple[float, List[Tuple[str, float]]]:
+    """Returns the total import time (s) and the cumulative time (s) of each top level module."""
+    modules = run_importtime("\n".join(imports))
+
+    # The modules imported at interpreter startup are paid by any process, not by the page
+    for module in baseline:
+        modules.pop(module, None)
+
+    return sum(modules.values()), sorted(
+        modules.items(), key=lambda m: m[1], reverse=True
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=5, help="Slowest modules to show")
+    args = parser.parse_args()
+
+    baseline = run_importtime("pass")
+
+    for page in find_pages():
+        try:
+            total, modules = measure_imports(get_page_imports(page), baseline)
+        except RuntimeError as e:
+            print(f"{page}: failed ({e})")
+            continue
+
+        print(f"{page}: {total:.2f}s")
+        for module, t in modules[: args.top]:
+            print(f"    {t:6.2f}s  {module}")
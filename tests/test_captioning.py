@@ -0,0 +1,60 @@
+import asyncio
+from functools import partial
+
+from app.backend.rate_limit import AsyncTokenBucket, retry_with_backoff
+from app.backend.splitters import captioning
+from app.backend.splitters.captioning import ImageCaptioningPipeline
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class CountingBucket(AsyncTokenBucket):
+    def __init__(self) -> None:
+        super().__init__(rate=1000)
+        self.acquired = 0
+
+    async def acquire(self):
+        self.acquired += 1
+        await super().acquire()
+
+
+def test_retries_take_a_token_each_and_release_the_slot(monkeypatch):
+    monkeypatch.setattr(
+        captioning, "retry_with_backoff", partial(retry_with_backoff, base_delay=0.05)
+    )
+    pipeline = ImageCaptioningPipeline(max_concurrency=1, max_retries=3)
+    bucket = CountingBucket()
+
+    failures = {"rate_limited": 2, "ok": 0}
+    in_flight, max_in_flight, completed = 0, 0, []
+
+    async def fake_client(name: str) -> str:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+        if failures[name] > 0:
+            failures[name] -= 1
+            raise RateLimitError()
+        completed.append(name)
+        return name
+
+    async def main():
+        semaphore = asyncio.Semaphore(pipeline.max_concurrency)
+        return await asyncio.gather(
+            pipeline._request(lambda: fake_client("rate_limited"), semaphore, bucket),
+            pipeline._request(lambda: fake_client("ok"), semaphore, bucket),
+        )
+
+    results = asyncio.run(main())
+
+    assert results == ["rate_limited", "ok"]
+    # Two failed attempts and the successful one, plus the request that never failed
+    assert bucket.acquired == 4
+    assert max_in_flight == 1
+    # The other request ran while the rate limited one was backing off
+    assert completed == ["ok", "rate_limited"]
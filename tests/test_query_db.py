@@ -0,0 +1,44 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from app.backend.utils import query_db
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "etf.sqlite3")
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(
+            "CREATE TABLE etf (isin TEXT, ter REAL, size INTEGER, age INTEGER, note TEXT, logo BLOB, mixed);"
+        )
+        conn.executemany(
+            "INSERT INTO etf VALUES (?,?,?,?,?,?,?);",
+            [
+                ("IE00B4L5Y983", 0.2, 60000, None, None, b"\x00", 1),
+                ("IE00B5BMR087", 0.07, 70000, 14, None, None, "a"),
+                ("LU0274208692", None, 3000, 17, None, b"\x01", 2.5),
+            ],
+        )
+    conn.close()
+    return path
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "SELECT * FROM etf",
+        "SELECT isin, size, size FROM etf",
+        "SELECT size, ter FROM etf WHERE size > 1000 AND age IS NOT NULL",
+        "SELECT * FROM etf WHERE size < 0",
+    ],
+)
+def test_columnar_fetch_matches_rows(db_path, query):
+    rows, column_names = query_db(db_path=db_path, query=query, return_df=False)
+    expected = pd.DataFrame(data=rows, columns=column_names)
+
+    df = query_db(db_path=db_path, query=query)
+
+    pd.testing.assert_frame_equal(df, expected)